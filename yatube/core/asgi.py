@@ -0,0 +1,202 @@
+"""ASGI-обработчик для Django 2.2.
+
+В Django 2.2 нет ни ASGI, ни асинхронных представлений, поэтому
+обработчик принимает соединения в цикле событий, а само приложение
+WSGI — представления, ORM и шаблоны — выполняет в пуле из
+ASGI_THREADS потоков. Медленный запрос к базе или миниатюре занимает
+поток пула, но не соединение сервера: остальные клиенты ждут в цикле
+событий, а не в очереди перед занятыми потоками. Запрос целиком, от
+представления до закрытия ответа, идёт в одном потоке, поэтому
+соединения с базой закрываются там же, где открылись. Части ответа
+уходят клиенту по мере готовности, поток ждёт, только если клиент
+не успевает читать. Если клиент закрыл соединение, поток бросает
+ответ на следующей части.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+# Сколько частей ответа ждёт отправки, прежде чем поток встанет
+BUFFERED_CHUNKS = 8
+
+
+def environ(scope, body):
+    """Окружение WSGI по scope запроса ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI хранит путь байтами в latin-1
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[name] = (
+            f'{environ[name]},{value}' if name in environ else value)
+    if 'CONTENT_LENGTH' not in environ:
+        # тело пришло частями (chunked): без длины Django читает его
+        # как пустое
+        environ['CONTENT_LENGTH'] = str(body.seek(0, os.SEEK_END))
+        body.seek(0)
+    return environ
+
+
+class ASGIHandler:
+    """Приложение ASGI 3 поверх приложения WSGI."""
+
+    def __init__(self, application=None, threads=None):
+        self.application = application or WSGIHandler()
+        self.executor = ThreadPoolExecutor(
+            threads or settings.ASGI_THREADS, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Тип соединения {scope["type"]} не поддержан')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(BUFFERED_CHUNKS)
+        closed = threading.Event()
+        future = loop.run_in_executor(
+            self.executor, self.respond, environ(scope, body), loop, queue,
+            closed)
+        disconnect = asyncio.ensure_future(self.disconnected(receive))
+        try:
+            while True:
+                message = asyncio.ensure_future(queue.get())
+                await asyncio.wait(
+                    {message, future, disconnect},
+                    return_when=asyncio.FIRST_COMPLETED)
+                if message.done():
+                    await send(message.result())
+                elif disconnect.done():
+                    # клиент ушёл: поток досрочно закрывает ответ
+                    self.close(queue, closed)
+                    break
+                else:
+                    # поток закончил: все части ответа уже в очереди
+                    while not queue.empty():
+                        await send(queue.get_nowait())
+                    break
+        except BaseException:
+            self.close(queue, closed)
+            # поток ещё может положить часть в очередь этого цикла
+            await asyncio.wait({future})
+            raise
+        finally:
+            message.cancel()
+            disconnect.cancel()
+        await future
+
+    def close(self, queue, closed):
+        """Останавливает поток ответа, ждущий места в очереди."""
+        closed.set()
+        while not queue.empty():
+            queue.get_nowait()
+
+    async def disconnected(self, receive):
+        """Ждёт, пока клиент не закроет соединение."""
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def read_body(self, receive):
+        """Тело запроса; большие загрузки уходят во временный файл."""
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                body.seek(0)
+                return body
+
+    def respond(self, environ, loop, queue, closed):
+        """Выполняет запрос в потоке пула и кладёт части ответа в очередь.
+        """
+        def put(message):
+            asyncio.run_coroutine_threadsafe(
+                queue.put(message), loop).result()
+
+        # по PEP 3333 генератор может вызвать start_response только
+        # перед первой непустой частью ответа
+        pending = []
+
+        def start_response(status, headers, exc_info=None):
+            pending[:] = [{
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [
+                    (name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in headers
+                ],
+            }]
+
+        def start():
+            if pending:
+                put(pending.pop())
+
+        try:
+            response = self.application(environ, start_response)
+            try:
+                for chunk in response:
+                    if closed.is_set():
+                        return
+                    if chunk:
+                        start()
+                        put({
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True,
+                        })
+                start()
+                put({'type': 'http.response.body', 'body': b''})
+            finally:
+                # request_finished: Django закрывает соединения этого потока
+                if hasattr(response, 'close'):
+                    response.close()
+        finally:
+            environ['wsgi.input'].close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ASGIHandler()
@@ -0,0 +1,228 @@
+import asyncio
+import http.client
+import itertools
+import threading
+import time
+from http import HTTPStatus
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.test import Client
+
+from core.asgi import ASGIHandler
+from posts.management.commands.benchmark import (PERCENTILES, percentile,
+                                                 targets)
+
+HOST = '127.0.0.1'
+
+
+class QuietWSGIServer(ThreadedWSGIServer):
+    # очередь accept() не должна отбрасывать соединения замера
+    request_queue_size = 1024
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WSGIMode:
+    """Сервер runserver: поток на каждое соединение."""
+    name = 'WSGI'
+
+    def __init__(self, options):
+        self.server = QuietWSGIServer((HOST, 0), QuietRequestHandler)
+        self.server.set_app(WSGIHandler())
+        self.address = self.server.server_address[:2]
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ASGIMode:
+    """core/asgi.py за минимальным HTTP-сервером на asyncio:
+    соединения принимает цикл событий, запросы идут в пуле потоков."""
+    name = 'ASGI'
+
+    def __init__(self, options):
+        self.application = ASGIHandler(threads=options['threads'])
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(
+            self.handle, HOST, 0, backlog=1024))
+        self.address = self.server.sockets[0].getsockname()[:2]
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    async def handle(self, reader, writer):
+        try:
+            method, target, version = (
+                await reader.readline()).decode('latin-1').split()
+            headers = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, value = line.decode('latin-1').split(':', 1)
+                headers.append((
+                    name.strip().lower().encode('latin-1'),
+                    value.strip().encode('latin-1')))
+            length = int(dict(headers).get(b'content-length', 0))
+            body = await reader.readexactly(length) if length else b''
+            path, _, query = target.partition('?')
+
+            messages = [{'type': 'http.request', 'body': body}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # клиент закрывает соединение, дочитав ответ
+                await reader.read()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status = HTTPStatus(message['status'])
+                    writer.write(
+                        f'HTTP/1.1 {status.value} {status.phrase}\r\n'.encode()
+                        + b''.join(
+                            name + b': ' + value + b'\r\n'
+                            for name, value in message['headers'])
+                        + b'connection: close\r\n\r\n')
+                else:
+                    writer.write(message.get('body', b''))
+                await writer.drain()
+
+            await self.application({
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': version.split('/')[1],
+                'method': method,
+                'scheme': 'http',
+                'path': unquote(path),
+                'raw_path': path.encode('latin-1'),
+                'query_string': query.encode('latin-1'),
+                'root_path': '',
+                'headers': headers,
+                'client': writer.get_extra_info('peername')[:2],
+                'server': self.address,
+            }, receive, send)
+        finally:
+            writer.close()
+
+    async def shutdown(self):
+        self.server.close()
+        # клиент дочитал ответ по Content-Length раньше, чем закрылось
+        # соединение; отменённые ожидания разрыва не ошибка
+        await asyncio.gather(
+            *(asyncio.all_tasks() - {asyncio.current_task()}),
+            return_exceptions=True)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.application.executor.shutdown()
+
+
+class Connection(threading.Thread):
+    """Клиент: запросы по кругу до дедлайна, соединение на запрос."""
+
+    def __init__(self, address, urls, headers, deadline):
+        super().__init__()
+        self.address = address
+        self.urls = urls
+        self.headers = headers
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        for url in itertools.cycle(self.urls):
+            if time.monotonic() >= self.deadline:
+                return
+            start = time.perf_counter()
+            connection = http.client.HTTPConnection(*self.address)
+            try:
+                connection.request('GET', url, headers=self.headers)
+                response = connection.getresponse()
+                response.read()
+            except OSError:
+                self.errors += 1
+                continue
+            finally:
+                connection.close()
+            if response.status != 200:
+                self.errors += 1
+                continue
+            self.latencies.append(time.perf_counter() - start)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность основных страниц при '
+            'многих одновременных соединениях через WSGI-сервер '
+            'runserver и через core/asgi.py. Серверы и клиенты работают '
+            'в одном процессе на 127.0.0.1.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=64)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--threads', type=int, default=settings.ASGI_THREADS,
+            help='Потоков пула ASGI.')
+
+    def run_mode(self, mode, urls, headers, options):
+        cache.clear()
+        server = mode(options)
+        try:
+            # прогрев: шаблоны, соединения с базой и кэш лент
+            warmup = Connection(
+                server.address, urls, headers, time.monotonic() + 1)
+            warmup.run()
+            deadline = time.monotonic() + options['seconds']
+            clients = [
+                Connection(server.address, urls, headers, deadline)
+                for number in range(options['connections'])
+            ]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+        finally:
+            server.stop()
+        latencies = sorted(
+            latency for client in clients for latency in client.latencies)
+        errors = sum(client.errors for client in clients)
+        timings = ', '.join(
+            f'p{percent} {percentile(latencies, percent) * 1000:.1f} мс'
+            for percent in PERCENTILES) if latencies else 'нет ответов'
+        self.stdout.write(
+            f'{server.name}: запросов/с '
+            f'{len(latencies) / options["seconds"]:.0f}, {timings}, '
+            f'ошибок {errors}')
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['threads'] < 1:
+            raise CommandError(
+                '--connections и --threads должны быть больше 0.')
+        follower, urls = targets()
+        client = Client()
+        client.force_login(follower)
+        headers = {
+            'Cookie': f'{settings.SESSION_COOKIE_NAME}='
+                      f'{client.cookies[settings.SESSION_COOKIE_NAME].value}',
+            'Connection': 'close',
+        }
+        urls = list(urls.values())
+        for mode in (WSGIMode, ASGIMode):
+            self.run_mode(mode, urls, headers, options)
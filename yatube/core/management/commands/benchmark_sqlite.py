@@ -0,0 +1,150 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from core.sqlite import is_locked, pragmas, retry_on_lock
+
+# Настройки SQLite по умолчанию, как до core/sqlite.py
+BASELINE_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+# Таймаут ожидания блокировки модуля sqlite3 и Django по умолчанию, сек.
+BASELINE_TIMEOUT = 5
+READ_SQL = (
+    'SELECT p.id, p.text, p.pub_date, u.username FROM posts_post p '
+    'INNER JOIN auth_user u ON p.author_id = u.id '
+    'ORDER BY p.pub_date DESC, p.id DESC LIMIT 10 OFFSET ?')
+WRITE_SQL = (
+    ('INSERT INTO posts_comment (post_id, author_id, text, created) '
+     'VALUES (?, ?, ?, ?)', lambda post, user: (
+         post, user, 'benchmark', timezone.now().isoformat(' '))),
+    ('UPDATE posts_postcounters SET comments = comments + 1 '
+     'WHERE post_id = ?', lambda post, user: (post,)),
+    ('UPDATE posts_usercounters SET comments = comments + 1 '
+     'WHERE user_id = ?', lambda post, user: (user,)),
+)
+
+
+class Worker(threading.Thread):
+    """Читатель или писатель, работающий до общего дедлайна."""
+
+    def __init__(self, path, tuned, deadline, write, ids):
+        super().__init__()
+        self.path = path
+        self.tuned = tuned
+        self.deadline = deadline
+        self.write = write
+        self.post_ids, self.user_ids = ids
+        self.done = 0
+        self.errors = 0
+        self.latencies = []
+
+    def connect(self):
+        db = sqlite3.connect(
+            self.path, isolation_level=None, timeout=BASELINE_TIMEOUT)
+        statements = pragmas() if self.tuned else pragmas(BASELINE_PRAGMAS)
+        for statement in statements:
+            db.execute(statement)
+        return db
+
+    def transaction(self, db):
+        post = random.choice(self.post_ids)
+        user = random.choice(self.user_ids)
+        db.execute('BEGIN')
+        try:
+            for sql, params in WRITE_SQL:
+                db.execute(sql, params(post, user))
+            db.execute('COMMIT')
+        except sqlite3.Error:
+            db.execute('ROLLBACK')
+            raise
+
+    def run(self):
+        db = self.connect()
+        try:
+            while time.monotonic() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    if not self.write:
+                        db.execute(
+                            READ_SQL, (random.randrange(100),)).fetchall()
+                    elif self.tuned:
+                        retry_on_lock(lambda: self.transaction(db))
+                    else:
+                        self.transaction(db)
+                except sqlite3.OperationalError as error:
+                    if not is_locked(error):
+                        raise
+                    self.errors += 1
+                    continue
+                self.latencies.append(time.perf_counter() - start)
+                self.done += 1
+        finally:
+            db.close()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность читателей и писателей '
+            'SQLite с настройками по умолчанию и с core/sqlite.py '
+            'на копии базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def run_mode(self, source, tuned, options, ids):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            shutil.copyfile(source, path)
+            deadline = time.monotonic() + options['seconds']
+            workers = [
+                Worker(path, tuned, deadline, write, ids)
+                for write in (
+                    [False] * options['readers']
+                    + [True] * options['writers'])
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        seconds = options['seconds']
+        reads = sum(w.done for w in workers if not w.write) / seconds
+        writers = [worker for worker in workers if worker.write]
+        writes = sum(worker.done for worker in writers) / seconds
+        errors = sum(worker.errors for worker in writers)
+        latencies = sorted(
+            latency for worker in writers for latency in worker.latencies)
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        self.stdout.write(
+            f'{"после" if tuned else "до":>5}: чтений/с {reads:.0f}, '
+            f'записей/с {writes:.0f}, ошибок блокировки {errors}, '
+            f'p95 записи {p95 * 1000:.1f} мс')
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда поддерживает только SQLite.')
+        with connection.cursor() as cursor:
+            # переносим WAL в основной файл, чтобы копия была полной
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            cursor.execute('SELECT post_id FROM posts_postcounters')
+            post_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT user_id FROM posts_usercounters')
+            user_ids = [row[0] for row in cursor.fetchall()]
+        if not post_ids:
+            raise CommandError(
+                'В базе нет постов; запустите сначала generate_data.')
+        source = settings.DATABASES[DEFAULT_DB_ALIAS]['NAME']
+        for tuned in (False, True):
+            self.run_mode(source, tuned, options, (post_ids, user_ids))
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди: письма и другие '
+            'медленные побочные действия запросов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить созревшие задачи и выйти.')
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Пауза между проверками очереди, сек.')
+        parser.add_argument(
+            '--batch', type=int, default=settings.TASK_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            done = tasks.run_pending(options['batch'])
+            total += done
+            if options['once'] and not done:
+                break
+            if not done:
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {total}.'))
@@ -0,0 +1,35 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик из '
+            'YATUBE_DB_REPLICAS, чтобы проверить чтение с реплик локально.')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: задайте '
+                               'YATUBE_DB_REPLICAS.')
+        databases = [DEFAULT_DB_ALIAS] + settings.DATABASE_REPLICAS
+        if any(connections[alias].vendor != 'sqlite' for alias in databases):
+            raise CommandError('Команда поддерживает только SQLite.')
+        source = sqlite3.connect(
+            connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                connections[alias].close()
+                # NAME реплики — URI только для чтения, писать нужно
+                # в сам файл
+                target = sqlite3.connect(
+                    settings.DATABASE_REPLICA_PATHS[alias])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'{alias}: скопирована')
+        finally:
+            source.close()
+        self.stdout.write(self.style.SUCCESS('Реплики синхронизированы.'))
@@ -0,0 +1,160 @@
+"""Метрики запросов в текстовом формате Prometheus.
+
+Длительность запроса пишется для каждого запроса, а число и время
+SQL-запросов, время рендеринга шаблонов и попадания в кэш — только
+для выборки запросов (METRICS_SAMPLE_RATE), чтобы накладные расходы
+оставались в пределах нескольких процентов.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.backends.django import DjangoTemplates, Template
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNTERS = (
+    ('sampled_requests_total', 'Запросы с подробными метриками.'),
+    ('db_queries_total', 'SQL-запросы в выборке.'),
+    ('db_query_seconds_total', 'Время SQL-запросов в выборке.'),
+    ('template_render_seconds_total', 'Время рендеринга шаблонов в выборке.'),
+    ('cache_hits_total', 'Попадания в кэш в выборке.'),
+    ('cache_misses_total', 'Промахи кэша в выборке.'),
+)
+PREFIX = 'yatube_'
+
+_lock = threading.Lock()
+_histograms = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+_durations = defaultdict(float)
+_counters = defaultdict(lambda: defaultdict(float))
+_current = threading.local()
+
+
+class Sample:
+    """Счётчики одного запроса из выборки."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_query_seconds = 0.0
+        self.template_render_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # обёртка connection.execute_wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_query_seconds += time.perf_counter() - start
+
+
+def current_sample():
+    return getattr(_current, 'sample', None)
+
+
+def start_sample():
+    _current.sample = Sample()
+    return _current.sample
+
+
+def stop_sample():
+    _current.sample = None
+
+
+def record(view, seconds, sample=None):
+    with _lock:
+        _histograms[view][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        _durations[view] += seconds
+        if sample is None:
+            return
+        counters = _counters[view]
+        counters['sampled_requests_total'] += 1
+        counters['db_queries_total'] += sample.db_queries
+        counters['db_query_seconds_total'] += sample.db_query_seconds
+        counters['template_render_seconds_total'] += (
+            sample.template_render_seconds)
+        counters['cache_hits_total'] += sample.cache_hits
+        counters['cache_misses_total'] += sample.cache_misses
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _durations.clear()
+        _counters.clear()
+
+
+def _label(view):
+    escaped = view.replace('\\', '\\\\').replace('"', '\\"')
+    return f'view="{escaped}"'
+
+
+def render():
+    """Снимок всех метрик в текстовом формате Prometheus 0.0.4."""
+    name = f'{PREFIX}request_duration_seconds'
+    lines = [
+        f'# HELP {name} Длительность обработки запроса.',
+        f'# TYPE {name} histogram',
+    ]
+    with _lock:
+        for view, buckets in sorted(_histograms.items()):
+            label = _label(view)
+            total = 0
+            for bound, count in zip(LATENCY_BUCKETS, buckets):
+                total += count
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {total}')
+            total += buckets[-1]
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {total}')
+            lines.append(f'{name}_sum{{{label}}} {_durations[view]}')
+            lines.append(f'{name}_count{{{label}}} {total}')
+        for counter, help_text in COUNTERS:
+            name = f'{PREFIX}{counter}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for view, counters in sorted(_counters.items()):
+                lines.append(
+                    f'{name}{{{_label(view)}}} {counters[counter]}')
+    return '\n'.join(lines) + '\n'
+
+
+class InstrumentedLocMemCache(LocMemCache):
+    """LocMemCache, считающий попадания и промахи запросов из выборки."""
+
+    def get(self, key, default=None, version=None):
+        missing = object()
+        value = super().get(key, missing, version)
+        sample = current_sample()
+        if sample is not None:
+            if value is missing:
+                sample.cache_misses += 1
+            else:
+                sample.cache_hits += 1
+        return default if value is missing else value
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        sample = current_sample()
+        if sample is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample.template_render_seconds += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, замеряющий рендеринг запросов из выборки."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,36 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from core import metrics
+from yatube.settings import METRICS_SAMPLE_RATE
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+
+class MetricsMiddleware:
+    """Собирает метрики по имени URL для страницы /metrics/."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = None
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                if random.random() < METRICS_SAMPLE_RATE:
+                    sample = metrics.start_sample()
+                    for connection in connections.all():
+                        stack.enter_context(
+                            connection.execute_wrapper(sample))
+                return self.get_response(request)
+        finally:
+            metrics.stop_sample()
+            match = getattr(request, 'resolver_match', None)
+            metrics.record(
+                match.view_name if match else UNRESOLVED_VIEW,
+                time.perf_counter() - start,
+                sample)
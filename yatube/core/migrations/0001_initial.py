@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Полный путь к функции для импорта', max_length=200, verbose_name='Функция')),
+                ('payload', models.TextField(verbose_name='Аргументы в JSON')),
+                ('run_at', models.DateTimeField(verbose_name='Запустить не раньше')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('failed', models.BooleanField(default=False, verbose_name='Попытки исчерпаны')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+                'ordering': ('run_at', 'id'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['failed', 'run_at'], name='task_due_idx'),
+        ),
+    ]
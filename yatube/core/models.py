@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class Task(models.Model):
+    """Отложенный вызов функции для фонового обработчика run_tasks."""
+    name = models.CharField(
+        max_length=200, verbose_name='Функция',
+        help_text='Полный путь к функции для импорта')
+    payload = models.TextField(verbose_name='Аргументы в JSON')
+    run_at = models.DateTimeField(verbose_name='Запустить не раньше')
+    attempts = models.PositiveIntegerField(
+        default=0, verbose_name='Попыток')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    failed = models.BooleanField(
+        default=False, verbose_name='Попытки исчерпаны')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('run_at', 'id')
+        indexes = (
+            models.Index(
+                fields=('failed', 'run_at'), name='task_due_idx'),
+        )
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,106 @@
+"""Чтение с реплик базы данных.
+
+Представления, помеченные read_from_replica, читают с реплик из
+DATABASE_REPLICAS по кругу, пропуская недоступные. Всё остальное, в
+том числе сессии, авторизация и любые записи, идёт в default. Если
+чтение с реплики всё же упало с ошибкой базы (файл пуст, нет таблиц),
+реплика выключается так же, как недоступная, а представление
+выполняется заново на default.
+Представления с pin_to_primary ставят клиенту короткоживущую куку,
+и пока она жива, его чтения тоже идут в default: автор сразу видит
+свой пост или комментарий, даже если реплика отстаёт.
+"""
+import threading
+import time
+from functools import wraps
+from itertools import count
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PIN_COOKIE = 'primary_pin'
+
+_state = threading.local()
+_turn = count()
+_down_until = {}
+
+
+def mark_down(alias):
+    """Пропускаем реплику следующие REPLICA_RETRY_SECONDS."""
+    _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def healthy(alias):
+    """Проверяет соединение; упавшую реплику пропускаем REPLICA_RETRY_SECONDS.
+    """
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        mark_down(alias)
+        return False
+    return True
+
+
+def choose_replica():
+    replicas = settings.DATABASE_REPLICAS
+    start = next(_turn)
+    for shift in range(len(replicas)):
+        alias = replicas[(start + shift) % len(replicas)]
+        if healthy(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if getattr(_state, 'replica', None) is None:
+            return DEFAULT_DB_ALIAS
+        return _state.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики содержат те же данные, что и основная база
+        return True
+
+
+def read_from_replica(view):
+    """Чтения представления идут на реплику, если клиент не закреплён."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (not settings.DATABASE_REPLICAS
+                or PIN_COOKIE in request.COOKIES):
+            return view(request, *args, **kwargs)
+        # сессия и пользователь читаются с основной базы: свежий вход
+        # может ещё не дойти до реплики
+        request.user.is_authenticated
+        _state.replica = choose_replica()
+        try:
+            return view(request, *args, **kwargs)
+        except DatabaseError:
+            if _state.replica == DEFAULT_DB_ALIAS:
+                raise
+            mark_down(_state.replica)
+            _state.replica = DEFAULT_DB_ALIAS
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = None
+    return wrapper
+
+
+def pin_to_primary(view):
+    """Закрепляет писавшего клиента за основной базой на REPLICA_PIN_SECONDS.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+    return wrapper
@@ -0,0 +1,103 @@
+"""Настройка SQLite под нагрузку.
+
+Каждое новое соединение получает PRAGMA из SQLITE_PRAGMAS: журнал WAL
+(читатели не блокируют писателя), synchronous=NORMAL (fsync только
+на контрольных точках WAL), mmap и увеличенный кэш страниц, а также
+ожидание блокировки вместо немедленной ошибки. Транзакция, которой
+SQLite всё же ответил «database is locked», повторяется целиком; то,
+что попытка успела сделать вне базы (записанные файлы), отменяется
+через on_rollback.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+from itertools import count
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked')
+# Первая пауза перед повтором, сек.; дальше растёт вдвое со случайным
+# разбросом, чтобы писатели не сталкивались снова
+LOCK_BACKOFF = 0.01
+
+logger = logging.getLogger(__name__)
+# Отмены побочных эффектов текущей попытки atomic_with_retry
+_attempt = threading.local()
+
+
+def pragmas(values=None):
+    """SQL для PRAGMA; по умолчанию — из SQLITE_PRAGMAS."""
+    if values is None:
+        values = settings.SQLITE_PRAGMAS
+    return [f'PRAGMA {name} = {value}' for name, value in values.items()]
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in pragmas():
+            cursor.execute(statement)
+
+
+def is_locked(error):
+    return any(message in str(error) for message in LOCKED_MESSAGES)
+
+
+def retry_on_lock(func, attempts=None):
+    """Вызывает func, повторяя её при блокировке базы."""
+    attempts = attempts or settings.SQLITE_LOCK_RETRIES
+    for attempt in count(1):
+        try:
+            return func()
+        except (OperationalError, sqlite3.OperationalError) as error:
+            if not is_locked(error) or attempt >= attempts:
+                raise
+            time.sleep(LOCK_BACKOFF * 2 ** attempt * random.random())
+
+
+def on_rollback(func):
+    """Вызовет func, если транзакция atomic_with_retry откатится.
+
+    Вне atomic_with_retry ничего не делает.
+    """
+    undo = getattr(_attempt, 'undo', None)
+    if undo is not None:
+        undo.append(func)
+
+
+def atomic_with_retry(view):
+    """transaction.atomic, повторяющий транзакцию при блокировке базы.
+
+    Внутри внешней транзакции повторять нечего: откатится вся она,
+    поэтому там ошибка пробрасывается сразу. После каждой откатившейся
+    попытки вызываются отмены, зарегистрированные через on_rollback.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        def run():
+            _attempt.undo = []
+            try:
+                with transaction.atomic():
+                    return view(*args, **kwargs)
+            except Exception:
+                for func in _attempt.undo:
+                    try:
+                        retry_on_lock(func)
+                    except Exception:
+                        # исходная ошибка важнее
+                        logger.exception('Отмена %r не удалась', func)
+                raise
+            finally:
+                _attempt.undo = None
+        if connection.in_atomic_block:
+            return run()
+        return retry_on_lock(run)
+    return wrapper
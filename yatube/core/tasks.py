@@ -0,0 +1,135 @@
+"""Фоновые задачи без внешнего брокера.
+
+Задача — строка таблицы Task с путём к функции и аргументами в JSON.
+Она создаётся в транзакции запроса, поэтому откатывается вместе с
+ним. Обработчик забирает задачу, сдвигая run_at на TASK_LEASE_SECONDS
+вперёд: если процесс упадёт, задачу подхватят после истечения аренды.
+Выполненная задача удаляется, упавшая повторяется с экспоненциальной
+паузой, а после TASK_MAX_ATTEMPTS попыток помечается failed.
+
+Задачи выполняет команда run_tasks (отдельный процесс) или, если
+задан TASK_WORKER_INTERVAL, фоновый поток процесса, поставившего
+задачу.
+"""
+import json
+import logging
+import threading
+import time
+import traceback
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core import mail
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Task
+
+logger = logging.getLogger(__name__)
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue(name, *args, delay=0, **kwargs):
+    """Ставит вызов функции name(*args, **kwargs) в очередь."""
+    task = Task.objects.create(
+        name=name,
+        payload=json.dumps([args, kwargs]),
+        run_at=timezone.now() + timedelta(seconds=delay))
+    start_worker()
+    return task
+
+
+def task(func):
+    """Добавляет функции метод delay, ставящий её вызов в очередь."""
+    name = f'{func.__module__}.{func.__qualname__}'
+
+    @wraps(func)
+    def delay(*args, **kwargs):
+        return enqueue(name, *args, **kwargs)
+    func.delay = delay
+    return func
+
+
+def _claim(task):
+    # UPDATE с условием на attempts выигрывает только один обработчик
+    now = timezone.now()
+    return Task.objects.filter(
+        pk=task.pk, attempts=task.attempts, run_at__lte=now
+    ).update(
+        attempts=F('attempts') + 1,
+        run_at=now + timedelta(seconds=settings.TASK_LEASE_SECONDS))
+
+
+def _execute(task):
+    args, kwargs = json.loads(task.payload)
+    try:
+        import_string(task.name)(*args, **kwargs)
+    except Exception:
+        attempts = task.attempts + 1
+        logger.exception('Задача %s, попытка %s', task.name, attempts)
+        Task.objects.filter(pk=task.pk).update(
+            last_error=traceback.format_exc(),
+            failed=attempts >= settings.TASK_MAX_ATTEMPTS,
+            run_at=timezone.now() + timedelta(
+                seconds=settings.TASK_RETRY_DELAY * 2 ** (attempts - 1)))
+        return False
+    Task.objects.filter(pk=task.pk).delete()
+    return True
+
+
+def run_pending(limit=None):
+    """Выполняет созревшие задачи; возвращает число обработанных."""
+    due = Task.objects.filter(
+        failed=False, run_at__lte=timezone.now()
+    )[:limit or settings.TASK_BATCH_SIZE]
+    done = 0
+    for task in due:
+        if _claim(task):
+            _execute(task)
+            done += 1
+    return done
+
+
+def _run():
+    while True:
+        time.sleep(settings.TASK_WORKER_INTERVAL)
+        try:
+            while run_pending():
+                pass
+        except Exception:
+            logger.exception('Не удалось выполнить фоновые задачи')
+        finally:
+            connections.close_all()
+
+
+def start_worker():
+    """Запускает фоновый поток задач, если он включён и ещё не идёт."""
+    global _worker
+    if not settings.TASK_WORKER_INTERVAL:
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_run, name='tasks', daemon=True)
+            _worker.start()
+
+
+@task
+def deliver_mail(subject, message, from_email, recipient_list,
+                 html_message=None):
+    mail.send_mail(
+        subject, message, from_email, recipient_list,
+        html_message=html_message)
+
+
+def send_mail(subject, message, from_email, recipient_list,
+              html_message=None):
+    """Как django.core.mail.send_mail, но письмо уходит из очереди."""
+    deliver_mail.delay(
+        subject, message, from_email, list(recipient_list),
+        html_message=html_message)
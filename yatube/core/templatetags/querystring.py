@@ -0,0 +1,15 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def querystring(context, **kwargs):
+    """Текущие GET-параметры с заменой переданных; None удаляет параметр."""
+    query = context['request'].GET.copy()
+    for key, value in kwargs.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return query.urlencode()
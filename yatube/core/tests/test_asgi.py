@@ -0,0 +1,185 @@
+import asyncio
+import threading
+import time
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from core.asgi import ASGIHandler
+
+
+def scope(path='/', query=b'', headers=(), method='GET'):
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query,
+        'headers': list(headers),
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 5000),
+    }
+
+
+def call(application, scope, body=b'', send=None, disconnect=None):
+    """Выполняет запрос ASGI; возвращает отправленные сообщения.
+
+    После тела receive ждёт события disconnect и сообщает о разрыве.
+    """
+    chunks = [body[:3], body[3:]]
+    messages = []
+
+    async def receive():
+        if not chunks:
+            while not (disconnect and disconnect.is_set()):
+                await asyncio.sleep(0.01)
+            return {'type': 'http.disconnect'}
+        return {
+            'type': 'http.request',
+            'body': chunks.pop(0),
+            'more_body': bool(chunks),
+        }
+
+    async def record(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send or record))
+    return messages
+
+
+class ASGIHandlerTest(SimpleTestCase):
+    def handler(self, application):
+        handler = ASGIHandler(application, threads=2)
+        self.addCleanup(handler.executor.shutdown)
+        return handler
+
+    def test_environ(self):
+        seen = {}
+
+        def application(environ, start_response):
+            seen.update(environ, body=environ['wsgi.input'].read())
+            start_response('201 Created', [('X-Test', '1')])
+            return [b'ok']
+
+        messages = call(self.handler(application), scope(
+            '/группа/', b'a=1', [
+                (b'content-type', b'text/plain'),
+                (b'x-forwarded-for', b'1.1.1.1'),
+                (b'x-forwarded-for', b'2.2.2.2'),
+            ], method='POST'), body=b'payload')
+        self.assertEqual(
+            '/группа/', seen['PATH_INFO'].encode('latin-1').decode())
+        self.assertEqual(seen['QUERY_STRING'], 'a=1')
+        self.assertEqual(seen['REQUEST_METHOD'], 'POST')
+        self.assertEqual(seen['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(seen['HTTP_X_FORWARDED_FOR'], '1.1.1.1,2.2.2.2')
+        self.assertEqual(seen['body'], b'payload')
+        # тело пришло частями без Content-Length
+        self.assertEqual(seen['CONTENT_LENGTH'], '7')
+        self.assertEqual(messages[0], {
+            'type': 'http.response.start',
+            'status': 201,
+            'headers': [(b'x-test', b'1')],
+        })
+        self.assertEqual(
+            b''.join(message.get('body', b'') for message in messages[1:]),
+            b'ok')
+
+    def test_response_streamed_by_chunks(self):
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            yield from (b'a', b'', b'b', b'c')
+
+        messages = call(self.handler(application), scope())
+        self.assertEqual(
+            [(message.get('body'), message.get('more_body'))
+             for message in messages[1:]],
+            [(b'a', True), (b'b', True), (b'c', True), (b'', None)])
+
+    def test_disconnect_closes_response(self):
+        produced = []
+        closed = []
+
+        class Body:
+            def __iter__(self):
+                for number in range(1000):
+                    produced.append(number)
+                    yield b'x'
+
+            def close(self):
+                closed.append(True)
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return Body()
+
+        async def send(message):
+            if message.get('body'):
+                raise ConnectionResetError
+
+        handler = self.handler(application)
+        with self.assertRaises(ConnectionResetError):
+            call(handler, scope(), send=send)
+        handler.executor.shutdown(wait=True)
+        self.assertEqual(closed, [True])
+        self.assertLess(len(produced), 1000)
+
+    def test_client_gone_while_streaming(self):
+        produced = []
+        closed = []
+        gone = threading.Event()
+
+        class Body:
+            def __iter__(self):
+                for number in range(1000):
+                    produced.append(number)
+                    if number == 10:
+                        gone.set()
+                    if gone.is_set():
+                        time.sleep(0.01)
+                    yield b'x'
+
+            def close(self):
+                closed.append(True)
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return Body()
+
+        call(self.handler(application), scope(), disconnect=gone)
+        self.assertEqual(closed, [True])
+        self.assertLess(len(produced), 1000)
+
+    def test_chunked_post_reaches_django(self):
+        seen = {}
+
+        def application(environ, start_response):
+            seen.update(WSGIRequest(environ).POST)
+            start_response('200 OK', [])
+            return []
+
+        call(self.handler(application), scope(method='POST', headers=[
+            (b'content-type', b'application/x-www-form-urlencoded'),
+        ]), body=b'text=chunked')
+        self.assertEqual(seen, {'text': ['chunked']})
+
+    def test_django_page(self):
+        messages = call(
+            ASGIHandler(threads=1), scope(reverse('about:author')))
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(b'<html', b''.join(
+            message.get('body', b'') for message in messages[1:]))
+
+    def test_lifespan(self):
+        events = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return events.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.handler(None)({'type': 'lifespan'}, receive, send))
+        self.assertEqual(
+            sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
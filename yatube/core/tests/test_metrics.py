@@ -0,0 +1,62 @@
+import re
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core import metrics
+
+User = get_user_model()
+
+INDEX_URL = reverse('posts:index')
+METRICS_URL = reverse('metrics')
+LOGIN_URL = reverse('admin:login')
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = Client()
+        cls.staff.force_login(
+            User.objects.create(username='staff', is_staff=True))
+        cls.user = Client()
+        cls.user.force_login(User.objects.create(username='user'))
+
+    def setUp(self):
+        metrics.reset()
+
+    def metric(self, content, name, view='posts:index'):
+        return float(re.search(
+            rf'^yatube_{name}{{view="{view}"(?:,le="\+Inf")?}} (\S+)$',
+            content, re.MULTILINE).group(1))
+
+    def test_metrics_admin_only(self):
+        for client in (self.client, self.user):
+            with self.subTest(client=client):
+                response = client.get(METRICS_URL)
+                self.assertRedirects(
+                    response, f'{LOGIN_URL}?next={METRICS_URL}')
+
+    @mock.patch('core.middleware.METRICS_SAMPLE_RATE', 1)
+    def test_sampled_request_metrics(self):
+        self.client.get(INDEX_URL)
+        self.client.get(INDEX_URL)
+        content = self.staff.get(METRICS_URL).content.decode()
+        self.assertEqual(
+            self.metric(content, 'request_duration_seconds_bucket'), 2)
+        self.assertEqual(self.metric(content, 'sampled_requests_total'), 2)
+        self.assertGreater(self.metric(content, 'db_queries_total'), 0)
+        self.assertGreater(
+            self.metric(content, 'template_render_seconds_total'), 0)
+        self.assertGreater(self.metric(content, 'cache_hits_total'), 0)
+        self.assertGreater(self.metric(content, 'cache_misses_total'), 0)
+
+    @mock.patch('core.middleware.METRICS_SAMPLE_RATE', 0)
+    def test_unsampled_request_metrics(self):
+        self.client.get(INDEX_URL)
+        content = self.staff.get(METRICS_URL).content.decode()
+        self.assertEqual(
+            self.metric(content, 'request_duration_seconds_count'), 1)
+        self.assertNotIn('yatube_sampled_requests_total{', content)
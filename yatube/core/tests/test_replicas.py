@@ -0,0 +1,150 @@
+import importlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection
+from django.db.utils import ConnectionHandler
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core import replicas
+from posts.models import Post
+from yatube import settings as project_settings
+
+User = get_user_model()
+
+REPLICAS = ['replica_0', 'replica_1']
+
+
+@replicas.read_from_replica
+def read_view(request):
+    return HttpResponse(replicas.ReplicaRouter().db_for_read(Post))
+
+
+@replicas.read_from_replica
+def broken_replica_view(request):
+    alias = replicas.ReplicaRouter().db_for_read(Post)
+    if alias != DEFAULT_DB_ALIAS:
+        raise OperationalError('no such table: posts_post')
+    return HttpResponse(alias)
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRouterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader')
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        replicas._down_until.clear()
+
+    def read(self, **cookies):
+        request = self.factory.get('/')
+        request.user = self.user
+        request.COOKIES.update(cookies)
+        return read_view(request).content.decode()
+
+    def test_default_outside_read_views(self):
+        router = replicas.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
+
+    @mock.patch('core.replicas.healthy', return_value=True)
+    def test_round_robin(self, healthy):
+        self.assertEqual(
+            {self.read() for _ in range(len(REPLICAS) * 2)}, set(REPLICAS))
+        self.assertEqual(
+            replicas.ReplicaRouter().db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    @mock.patch('core.replicas.healthy')
+    def test_health_fallback(self, healthy):
+        healthy.side_effect = lambda alias: alias == 'replica_1'
+        self.assertEqual({self.read() for _ in range(4)}, {'replica_1'})
+        healthy.side_effect = lambda alias: False
+        self.assertEqual(self.read(), DEFAULT_DB_ALIAS)
+
+    def test_unreachable_replica_skipped_for_a_while(self):
+        connection = mock.Mock()
+        connection.ensure_connection.side_effect = OperationalError
+        with mock.patch(
+                'core.replicas.connections', {'replica_0': connection}):
+            self.assertFalse(replicas.healthy('replica_0'))
+            self.assertFalse(replicas.healthy('replica_0'))
+        connection.ensure_connection.assert_called_once()
+
+    def test_missing_replica_file_not_created(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        path = os.path.join(directory, 'replica.sqlite3')
+        replica = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': f'file:{path}?mode=ro'},
+            'replica_0')
+        with mock.patch('core.replicas.connections', {'replica_0': replica}):
+            self.assertFalse(replicas.healthy('replica_0'))
+        self.assertFalse(os.path.exists(path))
+
+    def test_sync_replicas(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, 'source.sqlite3')
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE copied (id INTEGER)')
+        replica = os.path.join(directory, 'replica.sqlite3')
+        # реплики в настройках проекта такие, какими их задаёт окружение
+        with mock.patch.dict(os.environ, {'YATUBE_DB_REPLICAS': replica}):
+            configured = importlib.reload(project_settings)
+        self.addCleanup(importlib.reload, project_settings)
+        databases = {
+            **configured.DATABASES,
+            DEFAULT_DB_ALIAS: {
+                **configured.DATABASES[DEFAULT_DB_ALIAS], 'NAME': source},
+        }
+        with override_settings(
+                DATABASE_REPLICAS=configured.DATABASE_REPLICAS,
+                DATABASE_REPLICA_PATHS=configured.DATABASE_REPLICA_PATHS), \
+                mock.patch(
+                    'core.management.commands.sync_replicas.connections',
+                    ConnectionHandler(databases)):
+            call_command('sync_replicas', stdout=io.StringIO())
+        with sqlite3.connect(replica) as db:
+            self.assertEqual(db.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'copied'"
+            ).fetchone(), ('copied',))
+
+    @mock.patch('core.replicas.healthy', return_value=True)
+    def test_failed_replica_read_retried_on_default(self, healthy):
+        request = self.factory.get('/')
+        request.user = self.user
+        response = broken_replica_view(request)
+        self.assertEqual(response.content.decode(), DEFAULT_DB_ALIAS)
+        self.assertEqual(
+            len(replicas._down_until), 1, replicas._down_until)
+
+    @mock.patch('core.replicas.healthy', return_value=True)
+    def test_pinned_client_reads_primary(self, healthy):
+        self.assertEqual(
+            self.read(**{replicas.PIN_COOKIE: '1'}), DEFAULT_DB_ALIAS)
+
+    def test_write_pins_client(self):
+        post = Post.objects.create(text='text', author=self.user)
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:add_comment', args=[post.id]),
+            {'text': 'comment'})
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_pin_without_replicas(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('posts:profile_follow', args=[self.user.username]))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
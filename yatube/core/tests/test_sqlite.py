@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.sqlite import atomic_with_retry, on_rollback, retry_on_lock
+
+LOCKED = OperationalError('database is locked')
+
+
+@mock.patch('core.sqlite.time.sleep')
+class RetryOnLockTest(SimpleTestCase):
+    def test_retries_until_success(self, sleep):
+        func = mock.Mock(side_effect=[LOCKED, LOCKED, 'done'])
+        self.assertEqual(retry_on_lock(func), 'done')
+        self.assertEqual(func.call_count, 3)
+
+    @override_settings(SQLITE_LOCK_RETRIES=3)
+    def test_gives_up(self, sleep):
+        func = mock.Mock(side_effect=LOCKED)
+        with self.assertRaises(OperationalError):
+            retry_on_lock(func)
+        self.assertEqual(func.call_count, 3)
+
+    def test_other_errors_not_retried(self, sleep):
+        func = mock.Mock(side_effect=OperationalError('no such table'))
+        with self.assertRaises(OperationalError):
+            retry_on_lock(func)
+        func.assert_called_once()
+
+
+@mock.patch('core.sqlite.time.sleep')
+@mock.patch('core.sqlite.transaction.atomic', mock.MagicMock())
+@mock.patch('core.sqlite.connection', mock.Mock(in_atomic_block=False))
+class AtomicWithRetryTest(SimpleTestCase):
+    def test_failed_attempt_undone(self, sleep):
+        undo = mock.Mock()
+        results = [LOCKED, 'done']
+
+        def view():
+            on_rollback(undo)
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.assertEqual(atomic_with_retry(view)(), 'done')
+        undo.assert_called_once()
+
+    def test_undo_outside_transaction_ignored(self, sleep):
+        undo = mock.Mock()
+        on_rollback(undo)
+        self.assertEqual(atomic_with_retry(lambda: 'done')(), 'done')
+        undo.assert_not_called()
+
+
+class SqliteTuningTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        # synchronous=NORMAL — это 1, temp_store=MEMORY — 2
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('temp_store'), 2)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+
+    @mock.patch('core.sqlite.time.sleep')
+    def test_no_retry_inside_outer_transaction(self, sleep):
+        view = mock.Mock(side_effect=LOCKED)
+        with self.assertRaises(OperationalError):
+            atomic_with_retry(view)()
+        view.assert_called_once()
@@ -0,0 +1,70 @@
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import tasks
+from core.models import Task
+from posts.models import User
+
+CALLS = []
+
+
+@tasks.task
+def record(value, *, suffix=''):
+    CALLS.append(value + suffix)
+
+
+@tasks.task
+def explode():
+    raise ValueError('boom')
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_delay_runs_later(self):
+        record.delay('a', suffix='!')
+        self.assertEqual(CALLS, [])
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(CALLS, ['a!'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_not_due_tasks_wait(self):
+        tasks.enqueue(f'{__name__}.record', 'later', delay=60)
+        self.assertEqual(tasks.run_pending(), 0)
+        self.assertEqual(CALLS, [])
+
+    @override_settings(TASK_MAX_ATTEMPTS=2)
+    def test_retries_then_fails(self):
+        explode.delay()
+        for attempt in (1, 2):
+            with self.subTest(attempt=attempt):
+                self.assertEqual(tasks.run_pending(), 1)
+                task = Task.objects.get()
+                self.assertEqual(task.attempts, attempt)
+                self.assertIn('boom', task.last_error)
+                self.assertGreater(task.run_at, timezone.now())
+                Task.objects.update(run_at=timezone.now())
+        self.assertTrue(Task.objects.get().failed)
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_send_mail_is_queued(self):
+        tasks.send_mail('subject', 'body', 'from@yatube.ru', ['to@yatube.ru'])
+        self.assertEqual(mail.outbox, [])
+        tasks.run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['to@yatube.ru'])
+
+    def test_password_reset_mail_is_queued(self):
+        User.objects.create_user(
+            username='user', email='user@yatube.ru', password='password')
+        response = self.client.post(
+            reverse('users:password_reset_form'),
+            {'email': 'user@yatube.ru'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        tasks.run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('reset', mail.outbox[0].body)
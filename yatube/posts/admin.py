@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
@@ -10,6 +11,12 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # полнотекстовый индекс вместо LIKE '%...%' по всей таблице
+        if not search_term:
+            return queryset, False
+        return search.search(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
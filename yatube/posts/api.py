@@ -0,0 +1,185 @@
+"""JSON API лент для мобильного приложения.
+
+Только чтение: главная, группа, профиль, пост и лента подписок с
+курсорной пагинацией (?cursor=, см. posts/paginators.py) и пакетный
+запрос постов по id (?ids=1,2,3). Параметр ?fields=text,author
+оставляет в ответе только нужные поля: посты читаются через values()
+ровно с этими колонками и JOIN, без сборки объектов моделей, а
+картинка превращается в адрес файла.
+"""
+from django.http import JsonResponse
+
+from core.replicas import read_from_replica
+
+from posts import feed_cache, images
+from posts.conditional import (conditional, group_parts, index_parts,
+                               post_parts, profile_parts)
+from posts.models import Group, Post, User
+from posts.paginators import CursorPaginator
+from yatube.settings import API_BATCH_SIZE, POST_PER_PAGE
+
+# Поле ответа -> путь в values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments': 'counters__comments',
+}
+# Лента подписок читается из FeedItem: дата и id поста лежат в нём самом
+FEED_FIELDS = {
+    **{field: f'post__{path}' for field, path in POST_FIELDS.items()},
+    'id': 'post_id',
+    'pub_date': 'pub_date',
+}
+CONVERTERS = {
+    'image': lambda name: images.storage().url(name) if name else None,
+    'comments': lambda count: count or 0,
+}
+NOT_FOUND = 'Не найдено.'
+
+
+def error(detail, status):
+    return JsonResponse(
+        {'detail': detail}, status=status,
+        json_dumps_params={'ensure_ascii': False})
+
+
+def requested_fields(request):
+    """Поля из ?fields= в порядке POST_FIELDS; None, если есть лишние."""
+    if not request.GET.get('fields'):
+        return list(POST_FIELDS)
+    names = set(request.GET['fields'].split(','))
+    if not names <= POST_FIELDS.keys():
+        return None
+    return [field for field in POST_FIELDS if field in names]
+
+
+def invalid_fields():
+    return error(
+        f'Допустимые поля: {", ".join(POST_FIELDS)}.', status=400)
+
+
+def serialize(rows, fields, paths):
+    return [
+        {
+            field: CONVERTERS.get(field, lambda value: value)(
+                row[paths[field]])
+            for field in fields
+        }
+        for row in rows
+    ]
+
+
+def with_comments(etag_parts):
+    """ETag ленты API: число комментариев в ответе меняется, а
+    поколение ленты — нет."""
+    def parts(request, *args, **kwargs):
+        parts = etag_parts(request, *args, **kwargs)
+        if parts is None or 'comments' not in (
+                requested_fields(request) or ()):
+            return parts
+        return parts + (feed_cache.generation(feed_cache.COMMENTS),)
+    return parts
+
+
+def page_response(request, queryset, paths=POST_FIELDS,
+                  ordering=('-pub_date', '-id')):
+    fields = requested_fields(request)
+    if fields is None:
+        return invalid_fields()
+    # ключ курсора нужен пагинатору, даже если поле не запрошено
+    keys = [field.lstrip('-') for field in ordering]
+    page = CursorPaginator(
+        queryset.values(*{paths[field] for field in fields}, *keys),
+        POST_PER_PAGE, ordering,
+    ).get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': serialize(page, fields, paths),
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@read_from_replica
+@conditional(with_comments(index_parts))
+def index(request):
+    return page_response(request, Post.objects.all())
+
+
+@read_from_replica
+@conditional(with_comments(group_parts))
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True).first()
+    if group_id is None:
+        return error(NOT_FOUND, status=404)
+    return page_response(request, Post.objects.filter(group_id=group_id))
+
+
+@read_from_replica
+@conditional(with_comments(profile_parts))
+def profile(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True).first()
+    if author_id is None:
+        return error(NOT_FOUND, status=404)
+    return page_response(request, Post.objects.filter(author_id=author_id))
+
+
+@read_from_replica
+@conditional(post_parts)
+def post_detail(request, post_id):
+    fields = requested_fields(request)
+    if fields is None:
+        return invalid_fields()
+    rows = Post.objects.filter(id=post_id).values(
+        *{POST_FIELDS[field] for field in fields})
+    if not rows:
+        return error(NOT_FOUND, status=404)
+    return JsonResponse(
+        serialize(rows, fields, POST_FIELDS)[0],
+        json_dumps_params={'ensure_ascii': False})
+
+
+@read_from_replica
+def posts(request):
+    """Посты по списку ?ids= одним запросом, в порядке списка.
+
+    Несуществующие id перечисляются в missing.
+    """
+    fields = requested_fields(request)
+    if fields is None:
+        return invalid_fields()
+    try:
+        ids = list(dict.fromkeys(
+            int(post_id) for post_id in request.GET.get('ids', '').split(',')
+        ))
+    except ValueError:
+        return error('Ожидается ?ids=1,2,3.', status=400)
+    if len(ids) > API_BATCH_SIZE:
+        return error(
+            f'Не больше {API_BATCH_SIZE} постов за запрос.', status=400)
+    rows = {
+        row['id']: row
+        for row in Post.objects.filter(id__in=ids).values(
+            'id', *{POST_FIELDS[field] for field in fields})
+    }
+    return JsonResponse({
+        'results': serialize(
+            [rows[post_id] for post_id in ids if post_id in rows],
+            fields, POST_FIELDS),
+        'missing': [post_id for post_id in ids if post_id not in rows],
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@read_from_replica
+def follow_index(request):
+    # приложению нужен 401, а не редирект на форму входа
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация.', status=401)
+    return page_response(
+        request, request.user.feed_items.all(), paths=FEED_FIELDS,
+        ordering=('-pub_date', '-post_id'))
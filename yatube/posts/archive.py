@@ -0,0 +1,65 @@
+"""Архив постов автора в формате NDJSON для потоковой выгрузки.
+
+Посты читаются курсором базы порциями по EXPORT_CHUNK_SIZE, а
+комментарии — одним запросом на порцию, тоже курсором и в порядке
+постов, поэтому память не растёт ни с размером архива, ни с числом
+комментариев к посту, и первые строки уходят клиенту сразу.
+"""
+import json
+from itertools import groupby
+from operator import itemgetter
+
+from posts import bulk
+from posts.models import Comment
+from yatube.settings import EXPORT_CHUNK_SIZE
+
+
+def _comments(post_ids):
+    """Комментарии порции постов в порядке выгрузки постов."""
+    return Comment.objects.filter(
+        post_id__in=post_ids
+    ).order_by('post__pub_date', 'post_id', 'created', 'id').values_list(
+        'post_id', 'author__username', 'text', 'created'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def lines(author):
+    """Строки NDJSON: по одной на пост вместе с его комментариями.
+
+    Строка поста с множеством комментариев уходит частями по
+    EXPORT_CHUNK_SIZE комментариев.
+    """
+    posts = author.posts.order_by('pub_date', 'id').values_list(
+        'id', 'text', 'pub_date', 'group__slug', 'image'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for chunk in bulk.batches(posts, EXPORT_CHUNK_SIZE):
+        comments = groupby(
+            _comments([row[0] for row in chunk]), key=itemgetter(0))
+        commented_id, post_comments = next(comments, (None, ()))
+        for post_id, text, pub_date, group, image in chunk:
+            post = json.dumps({
+                'id': post_id,
+                'text': text,
+                'pub_date': pub_date.isoformat(),
+                'group': group or '',
+                'image': image or '',
+                'comments': [],
+            }, ensure_ascii=False)
+            # последний ключ — пустой список комментариев: его «]}»
+            # дописывается после комментариев
+            parts = [post[:-2]]
+            if commented_id == post_id:
+                for number, (_, username, comment, created) in enumerate(
+                        post_comments):
+                    parts.append(', ' if number else '')
+                    parts.append(json.dumps({
+                        'author': username,
+                        'text': comment,
+                        'created': created.isoformat(),
+                    }, ensure_ascii=False))
+                    if len(parts) >= EXPORT_CHUNK_SIZE:
+                        yield ''.join(parts)
+                        parts = []
+                commented_id, post_comments = next(comments, (None, ()))
+            parts.append(']}\n')
+            yield ''.join(parts)
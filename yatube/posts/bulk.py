@@ -0,0 +1,44 @@
+"""Помощники для массовой загрузки постов в обход сигналов.
+
+bulk_create не отправляет post_save, поэтому после загрузки ленты,
+счётчики и поисковый индекс нужно пересобрать через refresh_derived.
+"""
+from contextlib import contextmanager
+from itertools import islice
+
+from posts import counters, feeds, group_stats, images, search
+from posts.models import Comment, Post
+
+
+def batches(objects, size):
+    """Нарезает итерируемое на списки по size элементов."""
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def manual_dates():
+    """Позволяет задать pub_date и created вручную при bulk_create."""
+    fields = [
+        Post._meta.get_field('pub_date'), Comment._meta.get_field('created')]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def refresh_derived():
+    """Пересобирает ленты, счётчики, статистику групп, ссылки на
+    картинки и поиск."""
+    feeds.rebuild()
+    counters.recount()
+    group_stats.recount()
+    images.recount()
+    search.rebuild()
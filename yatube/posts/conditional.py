@@ -0,0 +1,103 @@
+"""Условные GET-запросы для HTML-страниц постов.
+
+ETag страницы собирается из поколений лент feed_cache (без запросов
+к базе), счётчиков из одной строки по первичному ключу, пользователя,
+адреса страницы с параметрами пагинации и CSRF-куки: форма на
+странице несёт токен, и после смены токена при входе закэшированная
+браузером страница не годится. Совпавший If-None-Match получает 304
+до вызова представления, то есть без пагинатора
+и шаблонов. Last-Modified не отдаётся: правки и комментарии не
+меняют дату последнего поста, а If-Modified-Since по ней вернул бы
+устаревшую страницу.
+"""
+from functools import wraps
+from hashlib import sha1
+
+from django.utils.cache import get_conditional_response, quote_etag
+
+from posts import feed_cache, write_behind
+from posts.models import Group, Post, UserCounters
+
+# Атрибут запроса: тег post_thumbnail отдал заглушку вместо миниатюры.
+# Заглушка из кэша фрагментов его не ставит и уходит с ETag, но готовая
+# миниатюра сбрасывает поколения лент поста (posts/thumbnails.py), а с
+# ними и ETag, так что 304 заглушку не закрепит
+THUMBNAIL_PENDING = 'thumbnail_pending'
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def make_etag(request, parts):
+    return quote_etag(sha1(repr((
+        request.user.pk, request.get_full_path(),
+        request.META.get('CSRF_COOKIE'), parts,
+    )).encode()).hexdigest())
+
+
+def conditional(etag_parts):
+    """Декоратор представления: etag_parts(request, *args, **kwargs)
+    возвращает кортеж версий содержимого или None, если объекта нет."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            parts = None
+            if request.method in SAFE_METHODS:
+                parts = etag_parts(request, *args, **kwargs)
+                if parts is not None:
+                    response = get_conditional_response(
+                        request, etag=make_etag(request, parts))
+                    if response is not None:
+                        return response
+            response = view(request, *args, **kwargs)
+            if (parts is not None and response.status_code == 200
+                    and not getattr(request, THUMBNAIL_PENDING, False)):
+                # представление могло выдать первый CSRF-токен: он уйдёт
+                # в куки и придёт со следующим запросом
+                response['ETag'] = make_etag(request, parts)
+            return response
+        return wrapper
+    return decorator
+
+
+def index_parts(request):
+    return (feed_cache.generation(feed_cache.INDEX_FEED),)
+
+
+def group_parts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True).order_by().first()
+    if group_id is None:
+        return None
+    return (feed_cache.generation(feed_cache.group_feed(group_id)),)
+
+
+def profile_parts(request, username):
+    counters = UserCounters.objects.filter(
+        user__username=username
+    ).values_list(
+        'user_id', 'posts', 'follows', 'followers', 'comments'
+    ).order_by().first()
+    if counters is None:
+        return None
+    parts = (
+        counters,
+        feed_cache.generation(feed_cache.author_feed(counters[0])))
+    if request.user.is_authenticated:
+        # кнопка «Подписаться» зависит от подписок зрителя
+        parts += (
+            feed_cache.generation(
+                feed_cache.user_follow_feed(request.user.id)),
+            write_behind.version(request.user.id))
+    return parts
+
+
+def post_parts(request, post_id):
+    author_id = Post.objects.filter(id=post_id).values_list(
+        'author_id', flat=True).order_by().first()
+    if author_id is None:
+        return None
+    return (
+        feed_cache.generation(feed_cache.post_page(post_id)),
+        feed_cache.generation(feed_cache.author_feed(author_id)),
+        # свой комментарий из журнала отложенной записи
+        write_behind.version(request.user.id),
+    )
@@ -0,0 +1,69 @@
+"""Денормализованные счётчики пользователей и постов.
+
+Счётчики меняются атомарными UPDATE ... SET x = x + 1 из сигналов
+в той же транзакции, что и сама запись, а команда recount
+пересчитывает их с нуля, если накопилось расхождение.
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import (Comment, Follow, Post, PostCounters, User,
+                          UserCounters)
+
+
+def change_user(user_id, **deltas):
+    UserCounters.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def change_post(post_id, **deltas):
+    PostCounters.objects.filter(post_id=post_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+@transaction.atomic
+def recount():
+    """Пересчитывает все счётчики; возвращает число исправленных строк."""
+    UserCounters.objects.bulk_create(
+        (UserCounters(user_id=user_id) for user_id in User.objects.filter(
+            counters__isnull=True).values_list('id', flat=True)),
+        ignore_conflicts=True)
+    PostCounters.objects.bulk_create(
+        (PostCounters(post_id=post_id) for post_id in Post.objects.filter(
+            counters__isnull=True).values_list('id', flat=True)),
+        ignore_conflicts=True)
+    users = User.objects.annotate(
+        real_posts=_count(Post.objects, 'author'),
+        real_follows=_count(Follow.objects, 'user'),
+        real_followers=_count(Follow.objects, 'author'),
+        real_comments=_count(Comment.objects, 'author'),
+    ).exclude(
+        counters__posts=F('real_posts'),
+        counters__follows=F('real_follows'),
+        counters__followers=F('real_followers'),
+        counters__comments=F('real_comments'),
+    ).values_list(
+        'id', 'real_posts', 'real_follows', 'real_followers', 'real_comments')
+    posts = Post.objects.annotate(
+        real_comments=_count(Comment.objects, 'post'),
+    ).exclude(
+        counters__comments=F('real_comments'),
+    ).values_list('id', 'real_comments')
+    repaired = 0
+    for user_id, posts_count, follows, followers, comments in list(users):
+        repaired += UserCounters.objects.filter(user_id=user_id).update(
+            posts=posts_count, follows=follows, followers=followers,
+            comments=comments)
+    for post_id, comments in list(posts):
+        repaired += PostCounters.objects.filter(post_id=post_id).update(
+            comments=comments)
+    return repaired
@@ -0,0 +1,74 @@
+"""Версионированный кэш фрагментов лент.
+
+Каждая лента имеет счётчик поколения в кэше. Номер поколения входит
+в ключ фрагмента, поэтому смена поколения из сигналов моделей
+мгновенно делает старые фрагменты недостижимыми, и их можно хранить
+часами без риска показать устаревшую ленту.
+"""
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from yatube.settings import FEED_CACHE_TIMEOUT
+
+GENERATION_KEY = 'feed-generation:{}'
+INDEX_FEED = 'index'
+FOLLOW_FEED = 'follow'
+GROUP_FEED = 'group'
+AUTHOR_FEED = 'author'
+POST_PAGE = 'post'
+# Число комментариев к постам в лентах API
+COMMENTS = 'comments'
+
+
+def user_follow_feed(user_id):
+    return f'{FOLLOW_FEED}:{user_id}'
+
+
+def group_feed(group_id):
+    return f'{GROUP_FEED}:{group_id}'
+
+
+def author_feed(author_id):
+    return f'{AUTHOR_FEED}:{author_id}'
+
+
+def post_page(post_id):
+    return f'{POST_PAGE}:{post_id}'
+
+
+def generation(feed):
+    key = GENERATION_KEY.format(feed)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, uuid4().hex, None)
+        value = cache.get(key)
+    return value
+
+
+def bump(*feeds):
+    cache.set_many(
+        {GENERATION_KEY.format(feed): uuid4().hex for feed in feeds}, None)
+
+
+def post_feeds(post):
+    """Ленты и страницы, на которых показан пост."""
+    return [
+        INDEX_FEED,
+        FOLLOW_FEED,
+        author_feed(post.author_id),
+        post_page(post.id),
+        *([group_feed(post.group_id)] if post.group_id else []),
+    ]
+
+
+def bump_post(post):
+    bump(*post_feeds(post))
+
+
+def context(*feeds):
+    """Переменные для тега {% cache %} в шаблоне ленты."""
+    return {
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+        'feed_cache_version': '-'.join(generation(feed) for feed in feeds),
+    }
@@ -0,0 +1,63 @@
+"""Материализованные ленты подписок (fan-out on write)."""
+from itertools import islice
+
+from django.db import transaction
+
+from posts.models import FeedItem, Follow, Post
+from yatube.settings import FEED_BATCH_SIZE
+
+
+def _bulk_insert(items):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, FEED_BATCH_SIZE))
+        if not batch:
+            return
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам всех подписчиков автора."""
+    _bulk_insert(
+        FeedItem(user_id=user_id, post_id=post.id, pub_date=post.pub_date)
+        for user_id in Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True).iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    _bulk_insert(
+        FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in Post.objects.filter(
+            author_id=author_id
+        ).values_list('id', 'pub_date').iterator()
+    )
+
+
+def trim(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    FeedItem.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+@transaction.atomic
+def rebuild(user_ids=None):
+    """Пересобирает ленты пользователей (всех, если список не задан)."""
+    feed_items = FeedItem.objects.all()
+    # одно условие — одно соединение с подписками: второй filter()
+    # по той же связи добавил бы ещё один JOIN и размножил строки
+    follows = {'author__following__isnull': False}
+    if user_ids is not None:
+        feed_items = feed_items.filter(user_id__in=user_ids)
+        follows = {'author__following__user_id__in': user_ids}
+    feed_items.delete()
+    _bulk_insert(
+        FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id, post_id, pub_date in Post.objects.filter(
+            **follows
+        ).values_list(
+            'author__following__user_id', 'id', 'pub_date'
+        ).order_by().distinct().iterator()
+    )
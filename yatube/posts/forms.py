@@ -1,5 +1,8 @@
 from django import forms
+from django.conf import settings
+from django.db import transaction
 
+from . import uploads
 from .models import Comment, Post
 
 
@@ -9,6 +12,25 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        limit = settings.POST_IMAGE_MAX_UPLOAD_MB
+        if image and 'image' in self.changed_data and (
+                image.size > limit * 1024 * 1024):
+            raise forms.ValidationError(
+                f'Картинка больше {limit} МБ, загрузите файл поменьше.')
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            # варианты старой картинки больше не подходят
+            self.instance.image_variants = ''
+        post = super().save(commit)
+        if commit and post.image and 'image' in self.changed_data:
+            # исходный файл уже сохранён, обработка идёт в пуле
+            transaction.on_commit(lambda: uploads.enqueue(post))
+        return post
+
 
 class CommentForm(forms.ModelForm):
 
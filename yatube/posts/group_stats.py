@@ -0,0 +1,123 @@
+"""Статистика групп для страницы /groups/.
+
+Число постов и время последнего поста лежат в GroupStats, а посты по
+часам за последнюю неделю — в GroupActivity. Сигналы постов меняют
+обе таблицы точечными UPDATE, поэтому список групп не делает GROUP BY
+по всем постам. Команда compact_group_stats удаляет устаревшие часы
+и пересчитывает статистику с нуля на случай расхождений.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+from posts.models import Group, GroupActivity, GroupStats, Post
+
+DAY = timedelta(days=1)
+WEEK = timedelta(days=7)
+SORTS = {
+    'trending': ('-posts_day', '-posts_week', '-stats__posts', 'title'),
+    'posts': ('-stats__posts', 'title'),
+    'recent': (F('stats__last_post_at').desc(nulls_last=True), 'title'),
+    'title': ('title',),
+}
+DEFAULT_SORT = 'trending'
+
+
+def _hour(moment):
+    return moment.astimezone(timezone.utc).replace(
+        minute=0, second=0, microsecond=0)
+
+
+def _latest(group_ref):
+    return Subquery(Post.objects.filter(
+        group_id=group_ref).order_by('-pub_date').values('pub_date')[:1])
+
+
+def _change_activity(group_id, pub_date, delta):
+    if pub_date < timezone.now() - WEEK:
+        return
+    hour = _hour(pub_date)
+    activity = GroupActivity.objects.filter(group_id=group_id, hour=hour)
+    if activity.update(posts=F('posts') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            GroupActivity.objects.create(
+                group_id=group_id, hour=hour, posts=delta)
+    except IntegrityError:
+        # час уже создал параллельный запрос
+        activity.update(posts=F('posts') + delta)
+
+
+def _change(group_id, pub_date, delta):
+    GroupStats.objects.filter(group_id=group_id).update(
+        posts=F('posts') + delta, last_post_at=_latest(group_id))
+    _change_activity(group_id, pub_date, delta)
+
+
+def post_added(post):
+    if post.group_id:
+        _change(post.group_id, post.pub_date, 1)
+
+
+def post_removed(post):
+    if post.group_id:
+        _change(post.group_id, post.pub_date, -1)
+
+
+def post_moved(post, old_group_id):
+    if old_group_id:
+        _change(old_group_id, post.pub_date, -1)
+    post_added(post)
+
+
+def with_stats(queryset):
+    """Группы со статистикой и числом постов за сутки и за неделю."""
+    now = timezone.now()
+    return queryset.select_related('stats').annotate(
+        posts_day=Coalesce(Sum(
+            'activity__posts', filter=Q(activity__hour__gt=now - DAY)), 0),
+        posts_week=Coalesce(Sum(
+            'activity__posts', filter=Q(activity__hour__gt=now - WEEK)), 0),
+    )
+
+
+def compact():
+    """Удаляет часы старше недели; возвращает число удалённых записей."""
+    deleted, _ = GroupActivity.objects.filter(
+        hour__lte=timezone.now() - WEEK).delete()
+    return deleted
+
+
+@transaction.atomic
+def recount():
+    """Пересчитывает статистику и почасовую активность всех групп."""
+    GroupStats.objects.bulk_create(
+        (GroupStats(group_id=group_id) for group_id in Group.objects.filter(
+            stats__isnull=True).values_list('id', flat=True)),
+        ignore_conflicts=True)
+    GroupStats.objects.update(
+        posts=Coalesce(Subquery(
+            Post.objects.filter(group_id=OuterRef('group_id')).order_by(
+            ).values('group_id').annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()), 0),
+        last_post_at=_latest(OuterRef('group_id')),
+    )
+    GroupActivity.objects.all().delete()
+    GroupActivity.objects.bulk_create(
+        (
+            GroupActivity(
+                group_id=row['group_id'], hour=row['hour'],
+                posts=row['total'])
+            for row in Post.objects.filter(
+                group__isnull=False,
+                pub_date__gt=_hour(timezone.now() - WEEK),
+            ).order_by().annotate(
+                hour=TruncHour('pub_date', tzinfo=timezone.utc),
+            ).values('group_id', 'hour').annotate(total=Count('pk'))
+        ),
+        batch_size=1000,
+    )
@@ -0,0 +1,95 @@
+"""Счётчики ссылок на файлы картинок постов.
+
+Одинаковые картинки хранятся одним файлом (posts/storage.py), поэтому
+удалять файл вместе с постом нельзя. Сигналы постов меняют
+StoredImage.refs, а когда ссылок не осталось, фоновая задача удаляет
+файл, его миниатюры sorl и варианты, если к тому времени картинку
+не загрузили снова. Команда dedupe_images переводит старые файлы
+на имена по хешу и пересчитывает ссылки через recount.
+"""
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from sorl.thumbnail import delete as delete_thumbnails
+
+from core.tasks import task
+from posts.models import Post, StoredImage
+
+
+def storage():
+    return Post.image.field.storage
+
+
+def acquire(name):
+    if not name:
+        return
+    images = StoredImage.objects.filter(name=name)
+    if images.update(refs=F('refs') + 1):
+        return
+    try:
+        with transaction.atomic():
+            StoredImage.objects.create(name=name, refs=1)
+    except IntegrityError:
+        # файл уже учёл параллельный запрос
+        images.update(refs=F('refs') + 1)
+
+
+def release(name, variant_paths=()):
+    if not name:
+        return
+    StoredImage.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1)
+    if StoredImage.objects.filter(name=name, refs=0).exists():
+        collect.delay(name, list(variant_paths))
+
+
+def discard(name):
+    """Файл, записанный откатившейся транзакцией.
+
+    Задача collect удалит его, если к тому времени на файл не сошлётся
+    ни один пост: ту же картинку мог сохранить параллельный запрос.
+    """
+    with transaction.atomic():
+        StoredImage.objects.get_or_create(name=name, defaults={'refs': 0})
+        collect.delay(name, [])
+
+
+@task
+def collect(name, variant_paths):
+    """Удаляет файл картинки, на который больше не ссылаются посты."""
+    if not StoredImage.objects.filter(name=name, refs=0).delete()[0]:
+        return
+    delete_thumbnails(name, delete_file=False)
+    storage().delete(name)
+    for path in variant_paths:
+        default_storage.delete(path)
+
+
+def shared_variants(name):
+    """Готовые варианты той же картинки у другого поста."""
+    return Post.objects.filter(image=name).exclude(
+        image_variants='').values_list('image_variants', flat=True).first()
+
+
+@transaction.atomic
+def recount():
+    """Пересчитывает ссылки на файлы по постам.
+
+    Файл, на который посты больше не ссылаются, мог ещё ждать задачи
+    collect: его строка остаётся с нулём ссылок, и collect ставится
+    снова, чтобы файл не остался на диске без учёта.
+    """
+    referenced = Post.objects.exclude(image='').values('image')
+    orphans = StoredImage.objects.exclude(name__in=referenced)
+    orphans.update(refs=0)
+    for name in orphans.values_list('name', flat=True).iterator():
+        collect.delay(name, [])
+    StoredImage.objects.filter(name__in=referenced).delete()
+    StoredImage.objects.bulk_create(
+        (
+            StoredImage(name=row['image'], refs=row['refs'])
+            for row in Post.objects.exclude(image='').order_by().values(
+                'image').annotate(refs=Count('pk'))
+        ),
+        batch_size=1000,
+    )
@@ -0,0 +1,146 @@
+import json
+import math
+import subprocess
+import time
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга; values отсортированы."""
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def targets():
+    """Самые нагруженные страницы: главная, горячая группа, «звезда»,
+    самый обсуждаемый пост и лента её самого активного подписчика."""
+    group = Group.objects.annotate(
+        total=Count('posts')).order_by('-total').first()
+    author = User.objects.order_by('-counters__followers').first()
+    post = Post.objects.order_by('-counters__comments').first()
+    follower = User.objects.order_by('-counters__follows').first()
+    if None in (group, author, post, follower):
+        raise CommandError(
+            'В базе нет данных; запустите сначала generate_data.')
+    return follower, {
+        'index': reverse('posts:index'),
+        'group_posts': reverse('posts:group', args=[group.slug]),
+        'profile': reverse('posts:profile', args=[author.username]),
+        'post_detail': reverse('posts:post_detail', args=[post.id]),
+        'follow_index': reverse('posts:follow_index'),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и число SQL-запросов основных страниц '
+            'через тестовый клиент и сохраняет результат в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument(
+            '--pages', type=int, default=1,
+            help='Сколько первых страниц пагинатора обходить по кругу.')
+        parser.add_argument('--output', help='Файл для результатов.')
+        parser.add_argument(
+            '--compare', help='Результаты прошлого прогона для сравнения.')
+
+    def measure(self, client, url, options):
+        for number in range(options['warmup']):
+            client.get(url)
+        timings = []
+        queries = []
+        for number in range(options['requests']):
+            if options['cold']:
+                cache.clear()
+            page = {'page': number % options['pages'] + 1}
+            # чтения лент уходят на реплики: считаем запросы всех баз
+            with ExitStack() as stack:
+                contexts = [
+                    stack.enter_context(CaptureQueriesContext(database))
+                    for database in connections.all()
+                ]
+                start = time.perf_counter()
+                response = client.get(url, page)
+                timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            queries.append(sum(len(context) for context in contexts))
+        timings.sort()
+        result = {
+            f'p{percent}_ms': round(percentile(timings, percent) * 1000, 2)
+            for percent in PERCENTILES
+        }
+        result['queries'] = round(sum(queries) / len(queries), 2)
+        result['max_queries'] = max(queries)
+        return result
+
+    def compare(self, results, path):
+        with open(path, encoding='utf-8') as file:
+            previous = json.load(file)
+        self.stdout.write(
+            f'Сравнение с {previous.get("commit") or path}:')
+        for view, current in results.items():
+            before = previous['views'].get(view)
+            if before is None:
+                continue
+            changes = ', '.join(
+                f'{key} {before[key]} -> {current[key]}'
+                for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries'))
+            self.stdout.write(f'  {view}: {changes}')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['pages'] < 1:
+            raise CommandError('--requests и --pages должны быть больше 0.')
+        follower, urls = targets()
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(follower)
+        results = {}
+        for view, url in urls.items():
+            results[view] = self.measure(client, url, options)
+            self.stdout.write(f'{view}: ' + ', '.join(
+                f'{key}={value}' for key, value in results[view].items()))
+        if options['compare']:
+            self.compare(results, options['compare'])
+        if options['output']:
+            report = {
+                'commit': git_commit(),
+                'database': {
+                    'users': User.objects.count(),
+                    'posts': Post.objects.count(),
+                    'follows': Follow.objects.count(),
+                },
+                'options': {
+                    key: options[key]
+                    for key in ('requests', 'warmup', 'cold', 'pages')
+                },
+                'views': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результаты сохранены в {options["output"]}.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import group_stats
+
+
+class Command(BaseCommand):
+    help = ('Удаляет почасовую активность групп старше недели '
+            'и пересчитывает статистику групп с нуля.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-recount', action='store_true',
+            help='Только удалить устаревшие часы.')
+
+    def handle(self, *args, **options):
+        deleted = group_stats.compact()
+        if not options['no_recount']:
+            group_stats.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Статистика групп сжата, удалено часов: {deleted}.'))
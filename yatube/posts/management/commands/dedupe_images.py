@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import delete as delete_thumbnails
+
+from posts import feed_cache, images
+from posts.models import Post
+from posts.storage import is_hashed
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов на имена по хешу содержимого: '
+            'одинаковые файлы остаются на диске в одном экземпляре.')
+
+    def handle(self, *args, **options):
+        storage = images.storage()
+        renamed = {}
+        freed = 0
+        for name in Post.objects.exclude(image='').order_by().values_list(
+                'image', flat=True).distinct().iterator():
+            if is_hashed(name) or not storage.exists(name):
+                continue
+            freed += storage.size(name)
+            with storage.open(name) as source:
+                renamed[name], created = storage.store(name, source)
+            if created:
+                freed -= storage.size(renamed[name])
+        # кэш лент хранит разметку со старыми адресами картинок
+        stale = set()
+        for old, new in renamed.items():
+            posts = Post.objects.filter(image=old)
+            for post in posts.only('id', 'author_id', 'group_id'):
+                stale.update(feed_cache.post_feeds(post))
+            posts.update(image=new)
+        images.recount()
+        feed_cache.bump(*stale)
+        for old in renamed:
+            delete_thumbnails(old, delete_file=False)
+            storage.delete(old)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {len(renamed)}, уникальных: '
+            f'{len(set(renamed.values()))}, освобождено байт: {freed}.'))
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts.models import Comment, FeedItem, Post
+from posts.paginators import FORWARD, CursorPaginator
+from yatube.settings import POST_PER_PAGE
+
+# Признаки плохого плана SQLite: полный проход таблицы и сортировка
+# во временном B-дереве вместо чтения готового порядка из индекса
+FULL_SCAN = 'SCAN'
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+def feed_queries(sample_id=1):
+    """Запросы, которые выполняют представления лент."""
+    cursor = (timezone.now(), sample_id)
+    posts = Post.objects.with_related()
+    follow = FeedItem.objects.filter(user_id=sample_id).select_related(
+        'post__author', 'post__group')
+    keyset = CursorPaginator(posts, POST_PER_PAGE)
+    follow_keyset = CursorPaginator(
+        follow, POST_PER_PAGE, ('-pub_date', '-post_id'))
+    return {
+        'index': posts[:POST_PER_PAGE],
+        'index count': Post.objects.all(),
+        'index cursor': posts.order_by(*keyset.ordering).filter(
+            keyset.keyset_filter(cursor, FORWARD))[:POST_PER_PAGE + 1],
+        'group': posts.filter(group_id=sample_id)[:POST_PER_PAGE],
+        'group count': Post.objects.filter(group_id=sample_id),
+        'profile': posts.filter(author_id=sample_id)[:POST_PER_PAGE],
+        'profile count': Post.objects.filter(author_id=sample_id),
+        'follow_index': follow[:POST_PER_PAGE],
+        'follow_index count': FeedItem.objects.filter(user_id=sample_id),
+        'follow_index cursor': follow.order_by(
+            *follow_keyset.ordering).filter(follow_keyset.keyset_filter(
+                cursor, FORWARD))[:POST_PER_PAGE + 1],
+        'post_detail comments': Comment.objects.filter(
+            post_id=sample_id).select_related('author'),
+    }
+
+
+def explain(queryset, count=False):
+    if count:
+        sql, params = queryset.order_by().values(
+            'pk').query.sql_with_params()
+        sql = f'SELECT COUNT(*) FROM ({sql}) subquery'
+    else:
+        sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def problems(plan):
+    return [
+        step for step in plan
+        if (step.startswith(FULL_SCAN) and 'USING' not in step)
+        or step.startswith(TEMP_SORT)
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Выводит EXPLAIN QUERY PLAN для запросов лент и завершается '
+            'ошибкой, если какой-то из них читает таблицу целиком '
+            'или сортирует без индекса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plan', action='store_true',
+            help='Печатать полный план каждого запроса.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда поддерживает только SQLite.')
+        failed = []
+        for name, queryset in feed_queries().items():
+            plan = explain(queryset, count=name.endswith('count'))
+            bad_steps = problems(plan)
+            style = self.style.ERROR if bad_steps else self.style.SUCCESS
+            self.stdout.write(style(
+                f'{name}: {"; ".join(bad_steps) or "индекс"}'))
+            if options['verbose_plan']:
+                for step in plan:
+                    self.stdout.write(f'    {step}')
+            if bad_steps:
+                failed.append(name)
+        if failed:
+            raise CommandError(
+                'Полный проход или сортировка без индекса в запросах: '
+                f'{", ".join(failed)}')
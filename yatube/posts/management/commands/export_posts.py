@@ -0,0 +1,75 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Post
+
+FIELDS = ('id', 'text', 'pub_date', 'author', 'group', 'image')
+FORMATS = ('ndjson', 'csv')
+
+
+def guess_format(path, format_):
+    if format_:
+        return format_
+    if path.endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+
+def rows(chunk_size):
+    """Посты в виде словарей; читает базу порциями без кэша queryset."""
+    for post_id, text, pub_date, author, group, image in (
+        Post.objects.order_by('id').values_list(
+            'id', 'text', 'pub_date', 'author__username', 'group__slug',
+            'image',
+        ).iterator(chunk_size=chunk_size)
+    ):
+        yield {
+            'id': post_id,
+            'text': text,
+            'pub_date': pub_date.isoformat(),
+            'author': author,
+            'group': group or '',
+            'image': image or '',
+        }
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты в NDJSON или CSV; '
+            'автор и группа пишутся как username и slug.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', help='Файл для выгрузки или «-» для stdout.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат; по умолчанию определяется по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['output']
+        format_ = guess_format(path, options['format'])
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0.')
+        file = (
+            self.stdout if path == '-'
+            else open(path, 'w', encoding='utf-8', newline=''))
+        try:
+            if format_ == 'csv':
+                writer = csv.DictWriter(file, FIELDS)
+                writer.writeheader()
+                write = writer.writerow
+            else:
+                def write(row):
+                    file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            total = 0
+            for row in rows(options['batch_size']):
+                write(row)
+                total += 1
+        finally:
+            if file is not self.stdout:
+                file.close()
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f'Выгружено постов: {total}.'))
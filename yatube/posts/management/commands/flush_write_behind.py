@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import write_behind
+
+
+class Command(BaseCommand):
+    help = ('Переносит в базу все комментарии и подписки из журнала '
+            'отложенной записи, например перед остановкой сервера.')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            written = write_behind.flush()
+            if not written:
+                break
+            total += written
+        self.stdout.write(self.style.SUCCESS(
+            f'Журнал сброшен, записей: {total}.'))
@@ -0,0 +1,122 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from posts import bulk
+from posts.models import Comment, Follow, Group, Post, User
+
+DATE_SPREAD = timedelta(days=365)
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса степенного распределения для random.choices."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетических пользователей, группы, посты, '
+            'комментарии и подписки со степенным распределением '
+            'популярности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель степенного закона для авторов и групп.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def insert(self, model, objects, total, **kwargs):
+        done = 0
+        for batch in bulk.batches(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, **kwargs)
+            done += len(batch)
+            self.stdout.write(
+                f'\r{model._meta.verbose_name_plural}: {done}/{total}',
+                ending='')
+        self.stdout.write('')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        skew = options['skew']
+        now = timezone.now()
+        prefix = f'gen{rng.getrandbits(32):08x}'
+
+        password = make_password(None)
+        self.insert(User, (
+            User(username=f'{prefix}_{i}', password=password)
+            for i in range(options['users'])
+        ), options['users'])
+        self.insert(Group, (
+            Group(
+                title=f'Группа {i}',
+                slug=f'{prefix}-{i}',
+                description=f'Описание группы {i}')
+            for i in range(options['groups'])
+        ), options['groups'])
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_').values_list('id', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('id', flat=True))
+        rng.shuffle(user_ids)
+        rng.shuffle(group_ids)
+        # Первые в перемешанных списках — «звёзды» и «горячие» группы
+        user_weights = zipf_weights(len(user_ids), skew)
+        group_weights = zipf_weights(len(group_ids), skew)
+
+        def random_date():
+            return now - DATE_SPREAD * rng.random() ** 2
+
+        with bulk.manual_dates():
+            self.insert(Post, (
+                Post(
+                    text=f'Пост номер {i}',
+                    author_id=rng.choices(
+                        user_ids, cum_weights=user_weights)[0],
+                    group_id=rng.choices(
+                        group_ids, cum_weights=group_weights)[0]
+                    if group_ids and rng.random() < 0.7 else None,
+                    pub_date=random_date())
+                for i in range(options['posts'])
+            ), options['posts'])
+            post_ids = list(Post.objects.filter(
+                author_id__in=user_ids).values_list('id', flat=True))
+            post_ids.sort(reverse=True)
+            post_weights = zipf_weights(len(post_ids), skew)
+            self.insert(Comment, (
+                Comment(
+                    post_id=rng.choices(
+                        post_ids, cum_weights=post_weights)[0],
+                    author_id=rng.choice(user_ids),
+                    text=f'Комментарий {i}',
+                    created=random_date())
+                for i in range(options['comments'] if post_ids else 0)
+            ), options['comments'])
+        self.insert(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in (
+                (rng.choice(user_ids),
+                 rng.choices(user_ids, cum_weights=user_weights)[0])
+                for _ in range(options['follows'])
+            )
+            if user_id != author_id
+        ), options['follows'], ignore_conflicts=True)
+
+        # bulk_create не отправляет сигналы: производные данные строим разом
+        self.stdout.write('Пересчёт лент, счётчиков и поискового индекса...')
+        bulk.refresh_derived()
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы.'))
@@ -0,0 +1,189 @@
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import bulk
+from posts.management.commands.export_posts import FORMATS, guess_format
+from posts.models import Group, Post, User
+
+
+def read_rows(file, format_):
+    if format_ == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise CommandError(f'Строка {number}: {error}')
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise CommandError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Lookup:
+    """Кэш id по естественному ключу, который дозагружает неизвестные
+    ключи одним запросом на пачку, а не запросом на строку."""
+
+    def __init__(self, model, field, factory=None):
+        self.model = model
+        self.field = field
+        self.factory = factory
+        self.ids = {}
+
+    def load(self, keys):
+        missing = {key for key in keys if key and key not in self.ids}
+        if not missing:
+            return
+        self.ids.update(self.model.objects.filter(
+            **{f'{self.field}__in': missing}
+        ).values_list(self.field, 'id'))
+        missing -= self.ids.keys()
+        if missing and self.factory is not None:
+            self.model.objects.bulk_create(
+                (self.factory(key) for key in missing),
+                ignore_conflicts=True)
+            self.ids.update(self.model.objects.filter(
+                **{f'{self.field}__in': missing}
+            ).values_list(self.field, 'id'))
+
+    def get(self, key):
+        return self.ids.get(key)
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает посты из NDJSON или CSV, который создаёт '
+            'export_posts, пачками bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', help='Файл для загрузки или «-» для stdin.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат; по умолчанию определяется по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--images',
+            help='Каталог с картинками из выгрузки; они копируются '
+                 'в хранилище медиафайлов.')
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Потоков для копирования картинок.')
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных авторов и группы, '
+                 'а не пропускать их посты.')
+
+    def copy_image(self, name):
+        if not name:
+            return ''
+        try:
+            source = open(os.path.join(self.images, name), 'rb')
+        except FileNotFoundError:
+            # пост без файла загружается без картинки, а не роняет импорт
+            self.stderr.write(f'Картинка не найдена: {name}')
+            self.missing_images += 1
+            return ''
+        with source:
+            # одинаковые картинки сохранятся одним файлом
+            return Post.image.field.storage.save(name, File(source))
+
+    def import_batch(self, batch, executor):
+        self.authors.load(row.get('author') for row in batch)
+        self.groups.load(row.get('group') for row in batch)
+        rows = []
+        for row in batch:
+            author_id = self.authors.get(row.get('author'))
+            group_id = self.groups.get(row.get('group'))
+            if author_id is None or (row.get('group') and group_id is None):
+                self.skipped += 1
+                continue
+            rows.append((row, author_id, group_id))
+        images = [row.get('image') or '' for row, _, _ in rows]
+        if executor is not None:
+            images = executor.map(self.copy_image, images)
+        posts = [
+            Post(
+                text=row.get('text') or '',
+                pub_date=parse_date(row.get('pub_date')),
+                author_id=author_id,
+                group_id=group_id,
+                image=image)
+            for (row, author_id, group_id), image in zip(rows, images)
+        ]
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+        return len(posts)
+
+    def handle(self, *args, **options):
+        path = options['input']
+        format_ = guess_format(path, options['format'])
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError(
+                '--batch-size и --workers должны быть больше 0.')
+        self.images = options['images']
+        create = options['create_missing']
+        password = make_password(None)
+        self.authors = Lookup(
+            User, 'username',
+            (lambda username: User(username=username, password=password))
+            if create else None)
+        self.groups = Lookup(
+            Group, 'slug',
+            (lambda slug: Group(title=slug, slug=slug, description=''))
+            if create else None)
+        self.skipped = 0
+        self.missing_images = 0
+        imported = 0
+        file = (
+            sys.stdin if path == '-'
+            else open(path, encoding='utf-8', newline=''))
+        executor = (
+            ThreadPoolExecutor(max_workers=options['workers'])
+            if self.images else None)
+        try:
+            with bulk.manual_dates():
+                for batch in bulk.batches(
+                        read_rows(file, format_), options['batch_size']):
+                    imported += self.import_batch(batch, executor)
+                    self.stdout.write(
+                        f'\rЗагружено постов: {imported}', ending='')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if file is not sys.stdin:
+                file.close()
+        self.stdout.write('')
+        # bulk_create не отправляет сигналы: производные данные строим разом
+        self.stdout.write('Пересчёт лент, счётчиков и поискового индекса...')
+        bulk.refresh_derived()
+        if self.skipped:
+            self.stdout.write(self.style.WARNING(
+                f'Пропущено постов с неизвестным автором или группой: '
+                f'{self.skipped}.'))
+        if self.missing_images:
+            self.stdout.write(self.style.WARNING(
+                f'Постов загружено без ненайденной картинки: '
+                f'{self.missing_images}.'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {imported}. Миниатюры можно построить '
+            'командой warm_thumbnails.'))
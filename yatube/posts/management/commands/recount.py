@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики пользователей и постов.'
+
+    def handle(self, *args, **options):
+        repaired = counters.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны, исправлено строк: {repaired}.'))
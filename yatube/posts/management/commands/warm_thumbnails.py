@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails, variants
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заранее строит миниатюры и адаптивные варианты картинок '
+            'всех постов в пуле процессов.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by()
+        names = posts.values_list('image', flat=True).iterator()
+        missing = posts.filter(image_variants='').order_by('id')
+        ids = list(missing.values_list('id', flat=True))
+        images = list(missing.values_list('image', flat=True))
+        if settings.IMAGE_WORKERS:
+            executor = thumbnails.get_executor()
+            results = executor.map(
+                thumbnails.generate, names, chunksize=100)
+            built = executor.map(
+                variants.generate, ids, images, chunksize=100)
+        else:
+            results = map(thumbnails.make, names)
+            built = map(variants.make, ids, images)
+        done = sum(1 for _ in results)
+        with_variants = sum(1 for _ in built)
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры готовы для картинок: {done}, '
+            f'варианты построены для картинок: {with_variants}.'))
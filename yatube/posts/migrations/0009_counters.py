@@ -0,0 +1,76 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:57
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    PostCounters = apps.get_model('posts', 'PostCounters')
+    UserCounters.objects.bulk_create(
+        (
+            UserCounters(
+                user_id=user.id,
+                posts=user.posts_count,
+                follows=user.follows_count,
+                followers=user.followers_count,
+                comments=user.comments_count,
+            )
+            for user in User.objects.annotate(
+                posts_count=Count('posts', distinct=True),
+                follows_count=Count('follower', distinct=True),
+                followers_count=Count('following', distinct=True),
+                comments_count=Count('comments', distinct=True),
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+    PostCounters.objects.bulk_create(
+        (
+            PostCounters(post_id=post.id, comments=post.comments_count)
+            for post in Post.objects.annotate(
+                comments_count=Count('comments')).order_by().iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_feeditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounters',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('comments', models.IntegerField(default=0, verbose_name='Комментариев')),
+            ],
+            options={
+                'verbose_name': 'Счётчики поста',
+                'verbose_name_plural': 'Счётчики постов',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts', models.IntegerField(default=0, verbose_name='Постов')),
+                ('follows', models.IntegerField(default=0, verbose_name='Подписок')),
+                ('followers', models.IntegerField(default=0, verbose_name='Подписчиков')),
+                ('comments', models.IntegerField(default=0, verbose_name='Комментариев')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:03
+
+from django.db import migrations, models
+import re
+from collections import Counter
+
+import django.db.models.deletion
+
+
+def has_fts5(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if has_fts5(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts '
+                'USING fts5(text)')
+            cursor.execute(
+                'INSERT INTO posts_post_fts (rowid, text) '
+                'SELECT id, text FROM posts_post')
+        return
+    Post = apps.get_model('posts', 'Post')
+    SearchPosting = apps.get_model('posts', 'SearchPosting')
+    for post_id, text in Post.objects.values_list('id', 'text').iterator():
+        SearchPosting.objects.bulk_create(
+            SearchPosting(term=term, post_id=post_id, weight=weight)
+            for term, weight in Counter(
+                word[:64] for word in re.findall(r'\w+', text.lower())
+            ).items())
+
+
+def drop_index(apps, schema_editor):
+    if has_fts5(schema_editor.connection):
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Вхождений')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Запись поискового индекса',
+                'verbose_name_plural': 'Записи поискового индекса',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchposting',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='term_post_search_constraint'),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:21
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    GroupActivity = apps.get_model('posts', 'GroupActivity')
+    GroupStats.objects.bulk_create(
+        (
+            GroupStats(
+                group_id=group.id,
+                posts=group.posts_count,
+                last_post_at=group.last_post_at,
+            )
+            for group in Group.objects.annotate(
+                posts_count=Count('posts'),
+                last_post_at=Max('posts__pub_date'),
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+    GroupActivity.objects.bulk_create(
+        (
+            GroupActivity(
+                group_id=row['group_id'], hour=row['hour'],
+                posts=row['total'])
+            for row in Post.objects.filter(
+                group__isnull=False,
+                pub_date__gt=timezone.now() - timedelta(days=7),
+            ).order_by().annotate(
+                hour=TruncHour('pub_date', tzinfo=timezone.utc),
+            ).values('group_id', 'hour').annotate(total=Count('pk'))
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group', verbose_name='Группа')),
+                ('posts', models.IntegerField(default=0, verbose_name='Постов')),
+                ('last_post_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний пост')),
+            ],
+            options={
+                'verbose_name': 'Статистика группы',
+                'verbose_name_plural': 'Статистика групп',
+            },
+        ),
+        migrations.CreateModel(
+            name='GroupActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('posts', models.IntegerField(default=0, verbose_name='Постов')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Активность группы',
+                'verbose_name_plural': 'Активность групп',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='groupactivity',
+            index=models.Index(fields=['hour'], name='activity_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupactivity',
+            constraint=models.UniqueConstraint(fields=('group', 'hour'), name='group_hour_activity_constraint'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_comment_keyset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.TextField(blank=True, editable=False, help_text='JSON-список [формат, ширина, файл], см. posts/variants.py', verbose_name='Варианты изображения'),
+        ),
+    ]
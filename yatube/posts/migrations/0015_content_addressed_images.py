@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:32
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def fill_stored_images(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    StoredImage = apps.get_model('posts', 'StoredImage')
+    StoredImage.objects.bulk_create(
+        (
+            StoredImage(name=row['image'], refs=row['refs'])
+            for row in Post.objects.exclude(image='').order_by().values(
+                'image').annotate(refs=Count('pk'))
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Файл')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Изображение'),
+        ),
+        migrations.RunPython(fill_stored_images, migrations.RunPython.noop),
+    ]
@@ -2,12 +2,24 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db import models
 
+from posts.storage import ContentAddressedStorage
 from yatube.settings import MAX_LENGHT_STR, MEDIA_POST_PATH
 
 
 User = get_user_model()
 
 FOLLOW_STR = 'Пользователь {0} подписан на {1}'
+FEED_STR = 'Пост {1} в ленте пользователя {0}'
+COUNTERS_STR = 'Счётчики {0}'
+ACTIVITY_STR = 'Посты группы {0} за час {1:%Y-%m-%d %H:00}'
+IMAGE_STR = '{0}: {1} ссылок'
+
+
+class PostQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Загружает авторов и группы одним запросом с постами."""
+        return self.select_related('author', 'group')
 
 
 class Post(models.Model):
@@ -30,17 +42,49 @@ class Post(models.Model):
     image = models.ImageField(
         'Изображение',
         upload_to=MEDIA_POST_PATH,
+        storage=ContentAddressedStorage(),
         blank=True,
+        db_index=True,
     )
+    image_variants = models.TextField(
+        'Варианты изображения',
+        blank=True,
+        editable=False,
+        help_text='JSON-список [формат, ширина, файл], см. posts/variants.py',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_id_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'),
+        )
 
     def __str__(self) -> str:
         return self.text[:MAX_LENGHT_STR]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # группа при загрузке: по ней сигналы замечают перенос поста
+        if 'group_id' in post.__dict__:
+            post.loaded_group_id = post.group_id
+        # картинка при загрузке: при замене старый файл освобождается
+        if {'image', 'image_variants'} <= post.__dict__.keys():
+            post.loaded_image = (post.image.name, post.image_variants)
+        return post
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Название')
@@ -75,7 +119,12 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         default_related_name = 'comments'
-        ordering = ('-created',)
+        ordering = ('-created', '-id')
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx'),
+        )
 
     def __str__(self) -> str:
         return self.text[:MAX_LENGHT_STR]
@@ -111,3 +160,169 @@ class Follow(models.Model):
     def __str__(self) -> str:
         return FOLLOW_STR.format(
             self.user.get_username(), self.author.get_username())
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out on write), поэтому
+    страница подписок читается одним диапазоном по индексу
+    (user, -pub_date) без соединения подписок с постами.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-pub_date', '-post_id')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='user_post_feed_constraint'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='feed_user_pub_date_idx'),
+        )
+
+    def __str__(self) -> str:
+        return FEED_STR.format(self.user_id, self.post_id)
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя для страницы профиля."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts = models.IntegerField('Постов', default=0)
+    follows = models.IntegerField('Подписок', default=0)
+    followers = models.IntegerField('Подписчиков', default=0)
+    comments = models.IntegerField('Комментариев', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self) -> str:
+        return COUNTERS_STR.format(self.user_id)
+
+
+class PostCounters(models.Model):
+    """Денормализованные счётчики поста для страницы поста."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пост'
+    )
+    comments = models.IntegerField('Комментариев', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики поста'
+        verbose_name_plural = 'Счётчики постов'
+
+    def __str__(self) -> str:
+        return COUNTERS_STR.format(self.post_id)
+
+
+class SearchPosting(models.Model):
+    """Запись обратного индекса поиска для баз без FTS5."""
+    term = models.CharField('Слово', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_postings',
+        verbose_name='Пост'
+    )
+    weight = models.PositiveIntegerField('Вхождений', default=1)
+
+    class Meta:
+        verbose_name = 'Запись поискового индекса'
+        verbose_name_plural = 'Записи поискового индекса'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'post'),
+                name='term_post_search_constraint'),
+        )
+
+    def __str__(self) -> str:
+        return self.term
+
+
+class GroupStats(models.Model):
+    """Денормализованная статистика группы для списка групп."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Группа'
+    )
+    posts = models.IntegerField('Постов', default=0)
+    last_post_at = models.DateTimeField(
+        'Последний пост', blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Статистика группы'
+        verbose_name_plural = 'Статистика групп'
+
+    def __str__(self) -> str:
+        return COUNTERS_STR.format(self.group_id)
+
+
+class GroupActivity(models.Model):
+    """Число постов группы за час для рейтинга популярных групп."""
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Группа'
+    )
+    hour = models.DateTimeField('Час')
+    posts = models.IntegerField('Постов', default=0)
+
+    class Meta:
+        verbose_name = 'Активность группы'
+        verbose_name_plural = 'Активность групп'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('group', 'hour'),
+                name='group_hour_activity_constraint'),
+        )
+        indexes = (
+            models.Index(fields=('hour',), name='activity_hour_idx'),
+        )
+
+    def __str__(self) -> str:
+        return ACTIVITY_STR.format(self.group_id, self.hour)
+
+
+class StoredImage(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField('Файл', max_length=100, unique=True)
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self) -> str:
+        return IMAGE_STR.format(self.name, self.refs)
@@ -0,0 +1,125 @@
+import base64
+import binascii
+import json
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+FORWARD = 'next'
+BACKWARD = 'prev'
+
+
+class CursorPage(Sequence):
+    """Страница ленты без знания общего количества записей."""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по упорядоченному набору полей.
+
+    Вместо COUNT(*) и OFFSET страница выбирается условием
+    «строго после последней показанной записи», поэтому стоимость
+    запроса не зависит от глубины листания. Курсор — непрозрачная
+    строка base64 с направлением и значениями ключа.
+    """
+    cursor_mode = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+
+    def encode_cursor(self, obj, direction):
+        # строки values() приходят словарями
+        values = [
+            obj[field] if isinstance(obj, Mapping) else getattr(obj, field)
+            for field in self.fields
+        ]
+        payload = json.dumps([direction, [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in values
+        ]])
+        return base64.urlsafe_b64encode(
+            payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = base64.urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(payload.decode())
+            if direction not in (FORWARD, BACKWARD):
+                raise ValueError(direction)
+            if len(values) != len(self.fields):
+                raise ValueError(values)
+            model = self.object_list.model
+            return direction, [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, TypeError, ValueError, ValidationError):
+            return None, None
+
+    def keyset_filter(self, values, direction):
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            descending = field.startswith('-') == (direction == FORWARD)
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(
+                **dict(zip(self.fields[:position], values[:position])),
+                **{f'{self.fields[position]}__{lookup}': values[position]}
+            )
+        return condition
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу по курсору; битый курсор — первая страница."""
+        direction, values = self.decode_cursor(cursor or '')
+        queryset = self.object_list.order_by(*self.ordering)
+        if direction is None:
+            direction = FORWARD
+        elif direction == FORWARD:
+            queryset = queryset.filter(self.keyset_filter(values, FORWARD))
+        else:
+            queryset = queryset.filter(
+                self.keyset_filter(values, BACKWARD)).reverse()
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if direction == BACKWARD:
+            objects.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return CursorPage(
+            objects,
+            self,
+            self.encode_cursor(objects[-1], FORWARD)
+            if objects and has_next else None,
+            self.encode_cursor(objects[0], BACKWARD)
+            if objects and has_previous else None,
+        )
@@ -0,0 +1,104 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite с FTS5 используется виртуальная таблица posts_post_fts
+с ранжированием bm25, на остальных базах — обратный индекс
+SearchPosting, который строится разбором текста на Python.
+Оба индекса обновляются из сигналов сохранения и удаления поста.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Count, Sum
+
+from posts.models import Post, SearchPosting
+from yatube.settings import FEED_BATCH_SIZE
+
+FTS_TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+MAX_TERM_LENGTH = SearchPosting._meta.get_field('term').max_length
+
+
+def terms(text):
+    return [
+        word[:MAX_TERM_LENGTH] for word in WORD.findall(text.lower())]
+
+
+@lru_cache(maxsize=None)
+def fts_available(vendor):
+    if vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def use_fts():
+    return fts_available(connection.vendor)
+
+
+def index_post(post):
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.id])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.id, post.text])
+        return
+    SearchPosting.objects.filter(post=post).delete()
+    SearchPosting.objects.bulk_create(
+        SearchPosting(term=term, post=post, weight=weight)
+        for term, weight in Counter(terms(post.text)).items())
+
+
+def unindex_post(post):
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.id])
+
+
+def rebuild():
+    """Перестраивает поисковый индекс по всем постам."""
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                'SELECT id, text FROM posts_post')
+        return
+    SearchPosting.objects.all().delete()
+    postings = []
+    for post_id, text in Post.objects.values_list(
+            'id', 'text').order_by().iterator():
+        postings.extend(
+            SearchPosting(term=term, post_id=post_id, weight=weight)
+            for term, weight in Counter(terms(text)).items())
+        if len(postings) >= FEED_BATCH_SIZE:
+            SearchPosting.objects.bulk_create(postings)
+            postings = []
+    SearchPosting.objects.bulk_create(postings)
+
+
+def search(queryset, query):
+    """Посты из queryset, подходящие под все слова запроса, по релевантности.
+    """
+    words = list(dict.fromkeys(terms(query)))
+    if not words:
+        return queryset.none()
+    if use_fts():
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = posts_post.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[' '.join(f'"{word}"' for word in words)],
+            select={'rank': f'bm25({FTS_TABLE})'},
+        ).order_by('rank', '-pub_date', '-id')
+    return queryset.filter(search_postings__term__in=words).annotate(
+        matched=Count('search_postings'),
+        rank=Sum('search_postings__weight'),
+    ).filter(matched=len(words)).order_by('-rank', '-pub_date', '-id')
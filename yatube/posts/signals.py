@@ -0,0 +1,112 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from posts import (counters, feed_cache, feeds, group_stats, images, search,
+                   variants)
+from posts.models import (Comment, Follow, Group, GroupStats, Post,
+                          PostCounters, User, UserCounters)
+
+
+def bump_post_feeds(post):
+    stale = [
+        feed_cache.INDEX_FEED,
+        feed_cache.author_feed(post.author_id),
+        feed_cache.post_page(post.id),
+    ]
+    if post.group_id:
+        stale.append(feed_cache.group_feed(post.group_id))
+    stale.extend(
+        feed_cache.user_follow_feed(user_id)
+        for user_id in Follow.objects.filter(
+            author_id=post.author_id).values_list('user_id', flat=True))
+    feed_cache.bump(*stale)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        PostCounters.objects.create(post=instance)
+        counters.change_user(instance.author_id, posts=1)
+        feeds.fan_out(instance)
+        group_stats.post_added(instance)
+        images.acquire(instance.image.name)
+    else:
+        if (hasattr(instance, 'loaded_group_id')
+                and instance.loaded_group_id != instance.group_id):
+            group_stats.post_moved(instance, instance.loaded_group_id)
+            # из ленты прежней группы пост пропал
+            if instance.loaded_group_id:
+                feed_cache.bump(
+                    feed_cache.group_feed(instance.loaded_group_id))
+        if (hasattr(instance, 'loaded_image')
+                and instance.loaded_image[0] != instance.image.name):
+            images.acquire(instance.image.name)
+            name, image_variants = instance.loaded_image
+            images.release(name, variants.paths(image_variants))
+    instance.loaded_group_id = instance.group_id
+    instance.loaded_image = (instance.image.name, instance.image_variants)
+    search.index_post(instance)
+    bump_post_feeds(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, posts=-1)
+    group_stats.post_removed(instance)
+    images.release(
+        instance.image.name, variants.paths(instance.image_variants))
+    search.unindex_post(instance)
+    bump_post_feeds(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.user_id, follows=1)
+        counters.change_user(instance.author_id, followers=1)
+        feeds.backfill(instance.user_id, instance.author_id)
+    feed_cache.bump(feed_cache.user_follow_feed(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.user_id, follows=-1)
+    counters.change_user(instance.author_id, followers=-1)
+    feeds.trim(instance.user_id, instance.author_id)
+    feed_cache.bump(feed_cache.user_follow_feed(instance.user_id))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if created:
+        GroupStats.objects.create(group=instance)
+
+
+@receiver((post_save, post_delete), sender=Group)
+def group_changed(sender, instance, **kwargs):
+    feed_cache.bump(
+        feed_cache.INDEX_FEED, feed_cache.FOLLOW_FEED,
+        feed_cache.group_feed(instance.id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, comments=1)
+        counters.change_post(instance.post_id, comments=1)
+        feed_cache.bump(feed_cache.COMMENTS)
+    feed_cache.bump(feed_cache.post_page(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, comments=-1)
+    counters.change_post(instance.post_id, comments=-1)
+    feed_cache.bump(
+        feed_cache.post_page(instance.post_id), feed_cache.COMMENTS)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.create(user=instance)
@@ -0,0 +1,76 @@
+"""Хранилище картинок постов по хешу содержимого.
+
+Имя файла — SHA-256 содержимого, поэтому одна и та же картинка,
+загруженная тысячей пользователей, лежит на диске один раз, а sorl
+и posts/variants.py строят для неё одну общую миниатюру и один набор
+вариантов. Хеш считается по частям файла, загрузка целиком в память
+не читается. Сколько постов ссылается на файл, хранит StoredImage
+(см. posts/images.py).
+"""
+import hashlib
+import os
+import posixpath
+import re
+from functools import partial
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from core.sqlite import on_rollback
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def file_hash(content):
+    """SHA-256 файла, прочитанного по частям."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    """posts/cat.JPG -> posts/ab/cd/abcd….jpg"""
+    return posixpath.join(
+        posixpath.dirname(name), digest[:2], digest[2:4],
+        digest + os.path.splitext(name)[1].lower())
+
+
+def discard(name):
+    # posts.images импортирует модели, а они — это хранилище
+    from posts import images
+    images.discard(name)
+
+
+def is_hashed(name):
+    return HASHED_NAME.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def store(self, name, content, max_length=None):
+        """Сохраняет файл по хешу; возвращает имя и признак новой записи.
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, file_hash(content))
+        content.seek(0)
+        if self.exists(name):
+            return name, False
+        saved = super().save(name, content, max_length)
+        if saved != name:
+            # параллельная загрузка того же содержимого успела между
+            # exists и save: её файл уже лежит под именем по хешу,
+            # а наша копия получила суффикс и не нужна
+            self.delete(saved)
+            return name, False
+        # запрос, чья транзакция откатится, не должен оставить файл
+        on_rollback(partial(discard, name))
+        return name, True
+
+    def save(self, name, content, max_length=None):
+        return self.store(name, content, max_length)[0]
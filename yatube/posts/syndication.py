@@ -0,0 +1,159 @@
+"""RSS и Atom ленты главной, групп и профилей.
+
+ETag и Last-Modified считаются по самому свежему посту ленты (один
+запрос по индексу) и поколению ленты из feed_cache, поэтому опрос
+без изменений получает 304 без рендеринга. Готовый XML лежит в кэше
+под ключом с тем же поколением и сбрасывается новым постом в ленте.
+"""
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date
+from django.utils.text import Truncator
+
+from posts import feed_cache
+from posts.models import Group, Post, User
+from yatube.settings import FEED_CACHE_TIMEOUT, SYNDICATION_ITEMS
+
+CONTENT_KEY = 'syndication:{}:{}:{}'
+TITLE_WORDS = 10
+
+
+class PostFeed(Feed):
+    """Общая часть лент: посты, условный GET и кэш XML."""
+
+    def posts(self, obj):
+        raise NotImplementedError
+
+    def cache_feed(self, obj):
+        raise NotImplementedError
+
+    def items(self, obj):
+        return self.posts(obj).with_related().order_by(
+            '-pub_date', '-id')[:SYNDICATION_ITEMS]
+
+    def item_title(self, post):
+        return Truncator(post.text).words(TITLE_WORDS)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=[post.id])
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_categories(self, post):
+        return [post.group.title] if post.group else []
+
+    def latest(self, obj):
+        return self.posts(obj).order_by('-pub_date', '-id').values_list(
+            'pub_date', flat=True).first()
+
+    def __call__(self, request, *args, **kwargs):
+        obj = self.get_object(request, *args, **kwargs)
+        feed = self.cache_feed(obj)
+        version = feed_cache.generation(feed)
+        latest = self.latest(obj)
+        last_modified = int(latest.timestamp()) if latest else None
+        etag = quote_etag(
+            f'{self.feed_type.__name__}-{version}-{last_modified or 0}')
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+        key = CONTENT_KEY.format(self.feed_type.__name__, feed, version)
+        content = cache.get(key)
+        if content is None:
+            feedgen = self.get_feed(obj, request)
+            content = feedgen.writeString('utf-8')
+            cache.set(key, content, FEED_CACHE_TIMEOUT)
+        response = HttpResponse(
+            content, content_type=self.feed_type.content_type)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class IndexFeed(PostFeed):
+    title = 'Yatube: последние посты'
+    description = 'Новые посты всех авторов.'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def cache_feed(self, obj):
+        return feed_cache.INDEX_FEED
+
+
+class GroupFeed(PostFeed):
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group', args=[group.slug])
+
+    def posts(self, group):
+        return group.posts.all()
+
+    def cache_feed(self, group):
+        return feed_cache.group_feed(group.id)
+
+
+class ProfileFeed(PostFeed):
+
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Посты пользователя {author.username}.'
+
+    def link(self, author):
+        return reverse('posts:profile', args=[author.username])
+
+    def posts(self, author):
+        return author.posts.all()
+
+    def cache_feed(self, author):
+        return feed_cache.author_feed(author.id)
+
+
+class IndexAtomFeed(IndexFeed):
+    feed_type = Atom1Feed
+    subtitle = IndexFeed.description
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, group):
+        return self.description(group)
+
+
+class ProfileAtomFeed(ProfileFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, author):
+        return self.description(author)
@@ -0,0 +1,40 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails, variants
+from posts.conditional import THUMBNAIL_PENDING
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, image):
+    """Готовая миниатюра картинки поста или None, пока она строится."""
+    if not image:
+        return None
+    thumbnail = thumbnails.ready(image)
+    if thumbnail is None:
+        thumbnails.enqueue(image.name, image.instance)
+        # без пула процессов миниатюра уже построена в enqueue
+        thumbnail = thumbnails.ready(image)
+    if thumbnail is None and 'request' in context:
+        setattr(context['request'], THUMBNAIL_PENDING, True)
+    return thumbnail
+
+
+@register.simple_tag
+def post_sources(post):
+    """Варианты картинки поста для post_picture; пусто — нет вариантов."""
+    return variants.sources(post)
+
+
+@register.inclusion_tag('posts/includes/post_picture.html')
+def post_picture(sources):
+    """<picture> с вариантами картинки поста по форматам и ширинам."""
+    width, height = variants.geometry()
+    return {
+        'sources': sources,
+        'sizes': settings.POST_IMAGE_SIZES,
+        'width': width,
+        'height': height,
+    }
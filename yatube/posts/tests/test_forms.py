@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -7,6 +8,7 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from posts.models import Comment, Group, Post, User
+from posts.storage import hashed_name
 
 USERNAME = 'test_user'
 AUTHOR = 'test_author'
@@ -21,6 +23,9 @@ SMALL_GIF = (
     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
     b'\x0A\x00\x3B'
 )
+# картинка хранится под хешем содержимого, а не под именем загрузки
+SMALL_GIF_NAME = hashed_name(
+    'posts/small.gif', hashlib.sha256(SMALL_GIF).hexdigest())
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -85,7 +90,7 @@ class PostFormTests(TestCase):
         post = Post.objects.get()
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group.id, form_data['group'])
-        self.assertEqual(post.image.name, f"posts/{form_data['image'].name}")
+        self.assertEqual(post.image.name, SMALL_GIF_NAME)
         self.assertEqual(post.author, self.user_author)
         self.assertRedirects(response, PROFILE_URL)
 
@@ -107,7 +112,7 @@ class PostFormTests(TestCase):
         post = Post.objects.get(id=self.post.id)
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group.id, form_data['group'])
-        self.assertEqual(post.image.name, f"posts/{form_data['image'].name}")
+        self.assertEqual(post.image.name, SMALL_GIF_NAME)
         self.assertEqual(post.author, self.user_author)
         self.assertRedirects(response, self.POST_DETAIL_URL)
 
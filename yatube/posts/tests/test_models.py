@@ -1,6 +1,26 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-from posts.models import Comment, Follow, Group, Post, User, FOLLOW_STR
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import tasks
+from core.sqlite import atomic_with_retry
+from posts import feed_cache, images
+from posts.models import (Comment, Follow, Group, GroupActivity, GroupStats,
+                          Post, PostCounters, StoredImage, User,
+                          UserCounters, FOLLOW_STR)
+from posts.storage import is_hashed
 from yatube.settings import MAX_LENGHT_STR
 
 
@@ -41,3 +61,266 @@ class PostModelTest(TestCase):
         for key, str_value in str_dict.items():
             with self.subTest(key=key):
                 self.assertEqual(str_value, str(key))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create(username='user_test')
+        cls.author = User.objects.create(username='author_test')
+        cls.post = Post.objects.create(text='Test text', author=cls.author)
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.user, text='test comment text')
+        cls.follow = Follow.objects.create(author=cls.author, user=cls.user)
+
+    def assertCounters(self, user_counters, post_comments):
+        for user, values in user_counters.items():
+            with self.subTest(user=user):
+                counters = UserCounters.objects.get(user=user)
+                self.assertEqual(
+                    (counters.posts, counters.follows,
+                     counters.followers, counters.comments),
+                    values)
+        self.assertEqual(
+            PostCounters.objects.get(post=self.post).comments, post_comments)
+
+    def test_counters_on_create(self):
+        self.assertCounters({
+            self.user: (0, 1, 0, 1),
+            self.author: (1, 0, 1, 0),
+        }, 1)
+
+    def test_counters_on_delete(self):
+        self.comment.delete()
+        self.follow.delete()
+        Post.objects.create(text='Another text', author=self.author)
+        self.assertCounters({
+            self.user: (0, 0, 0, 0),
+            self.author: (2, 0, 0, 0),
+        }, 0)
+
+    def test_recount(self):
+        UserCounters.objects.update(posts=100, followers=100)
+        PostCounters.objects.update(comments=100)
+        call_command('recount', stdout=io.StringIO())
+        self.assertCounters({
+            self.user: (0, 1, 0, 1),
+            self.author: (1, 0, 1, 0),
+        }, 1)
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author_test')
+        cls.group = Group.objects.create(title='group', slug='group')
+        Post.objects.create(text='text', author=cls.author, group=cls.group)
+
+    def test_compact_group_stats(self):
+        GroupStats.objects.update(posts=100)
+        GroupActivity.objects.create(
+            group=self.group, hour=timezone.now() - timedelta(days=8))
+        call_command('compact_group_stats', stdout=io.StringIO())
+        self.assertEqual(GroupStats.objects.get(group=self.group).posts, 1)
+        self.assertEqual(
+            list(GroupActivity.objects.values_list('posts', flat=True)), [1])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+class ContentAddressedImagesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author_test')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_post(self, name, content=b'same meme'):
+        return Post.objects.create(
+            text='text', author=self.author,
+            image=SimpleUploadedFile(name=name, content=content))
+
+    def refs(self, post):
+        return StoredImage.objects.get(name=post.image.name).refs
+
+    def test_identical_uploads_share_file(self):
+        first = self.create_post('first.jpg')
+        second = self.create_post('second.JPG')
+        other = self.create_post('first.jpg', b'other meme')
+        self.assertTrue(is_hashed(first.image.name))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertEqual(self.refs(first), 2)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(first.image.path))), 1)
+
+    def test_concurrent_identical_upload(self):
+        first = self.create_post('first.jpg')
+        storage = Post.image.field.storage
+        exists = storage.exists
+        checks = []
+
+        def racing_exists(name):
+            # параллельная загрузка сохранила файл сразу после проверки
+            checks.append(name)
+            return len(checks) > 1 and exists(name)
+
+        with mock.patch.object(storage, 'exists', racing_exists):
+            second = self.create_post('second.jpg')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(self.refs(first), 2)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(first.image.path))), 1)
+
+    def test_file_removed_with_last_reference(self):
+        first = self.create_post('first.jpg')
+        second = self.create_post('second.jpg')
+        name = first.image.name
+        first.delete()
+        tasks.run_pending()
+        self.assertEqual(self.refs(second), 1)
+        self.assertTrue(default_storage.exists(name))
+        second.image = SimpleUploadedFile(name='new.jpg', content=b'new')
+        second.save()
+        tasks.run_pending()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredImage.objects.filter(name=name).exists())
+        self.assertEqual(self.refs(second), 1)
+
+    def test_rolled_back_upload_collected(self):
+        @atomic_with_retry
+        def view():
+            self.create_post('first.jpg', b'lost meme')
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            view()
+        name = StoredImage.objects.get(refs=0).name
+        tasks.run_pending()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredImage.objects.exists())
+
+    def test_dedupe_images(self):
+        for name in ('posts/a.jpg', 'posts/b.jpg'):
+            default_storage.save(name, ContentFile(b'old meme'))
+            Post.objects.bulk_create(
+                [Post(text='text', author=self.author, image=name)])
+        index = feed_cache.generation(feed_cache.INDEX_FEED)
+        call_command('dedupe_images', stdout=io.StringIO())
+        self.assertNotEqual(
+            feed_cache.generation(feed_cache.INDEX_FEED), index)
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_hashed(name))
+        self.assertEqual(StoredImage.objects.get(name=name).refs, 2)
+        self.assertFalse(default_storage.exists('posts/a.jpg'))
+        self.assertFalse(default_storage.exists('posts/b.jpg'))
+
+    def test_recount_keeps_pending_collect(self):
+        post = self.create_post('first.jpg')
+        name = post.image.name
+        post.image = SimpleUploadedFile(name='new.jpg', content=b'new')
+        post.save()
+        # collect для старого файла ещё не выполнен
+        images.recount()
+        self.assertEqual(StoredImage.objects.get(name=name).refs, 0)
+        tasks.run_pending()
+        self.assertFalse(default_storage.exists(name))
+        self.assertEqual(self.refs(post), 1)
+
+
+class FeedIndexesTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        call_command('explain_feeds', stdout=io.StringIO())
+
+
+class GenerateDataTest(TestCase):
+    def test_generate_data_and_benchmark(self):
+        devnull = open(os.devnull, 'w')
+        self.addCleanup(devnull.close)
+        call_command(
+            'generate_data', users=20, groups=3, posts=60, comments=80,
+            follows=40, seed=1, stdout=devnull)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 80)
+        self.assertEqual(UserCounters.objects.count(), 20)
+        self.assertEqual(PostCounters.objects.count(), 60)
+        follow = Follow.objects.first()
+        self.assertEqual(
+            follow.user.feed_items.count(),
+            Post.objects.filter(
+                author__following__user=follow.user).count())
+        call_command('benchmark', requests=2, warmup=0, stdout=devnull)
+
+
+class ImportExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author_export')
+        cls.group = Group.objects.create(
+            title='export group', slug='export_group', description='-')
+        Post.objects.create(
+            text='Пост с группой,\n"кавычками"',
+            author=cls.author, group=cls.group)
+        Post.objects.create(text='Пост без группы', author=cls.author)
+
+    def roundtrip(self, extension, **options):
+        devnull = open(os.devnull, 'w')
+        self.addCleanup(devnull.close)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, f'posts.{extension}')
+        call_command('export_posts', path, stdout=devnull)
+        exported = list(Post.objects.values_list(
+            'text', 'pub_date', 'author', 'group'))
+        Post.objects.all().delete()
+        call_command('import_posts', path, stdout=devnull, **options)
+        self.assertCountEqual(
+            Post.objects.values_list('text', 'pub_date', 'author', 'group'),
+            exported)
+        self.assertEqual(self.author.feed_items.count(), 0)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author).posts, 2)
+
+    def test_ndjson_roundtrip(self):
+        self.roundtrip('ndjson')
+
+    def test_csv_roundtrip(self):
+        self.roundtrip('csv')
+
+    def test_unknown_authors(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'posts.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(
+                '{"text": "новый", "author": "newcomer", "group": ""}\n')
+        devnull = open(os.devnull, 'w')
+        self.addCleanup(devnull.close)
+        call_command('import_posts', path, stdout=devnull)
+        self.assertFalse(Post.objects.filter(text='новый').exists())
+        call_command('import_posts', path, create_missing=True, stdout=devnull)
+        self.assertTrue(Post.objects.filter(
+            text='новый', author__username='newcomer').exists())
+
+    def test_missing_image(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'posts.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(
+                '{"text": "без файла", "author": "author_export", '
+                '"image": "posts/missing.gif"}\n')
+        devnull = open(os.devnull, 'w')
+        self.addCleanup(devnull.close)
+        stderr = io.StringIO()
+        call_command(
+            'import_posts', path, images=directory,
+            stdout=devnull, stderr=stderr)
+        self.assertEqual(
+            Post.objects.get(text='без файла').image.name, '')
+        self.assertIn('posts/missing.gif', stderr.getvalue())
@@ -9,15 +9,31 @@ POST_ID = 1
 
 URLS_ROUTES = [
     ['/', 'index', []],
+    ['/groups/', 'group_list', []],
+    ['/search/', 'search', []],
+    ['/rss/', 'index_rss', []],
+    ['/atom/', 'index_atom', []],
+    [f'/group/{SLUG}/rss/', 'group_rss', [SLUG]],
+    [f'/group/{SLUG}/atom/', 'group_atom', [SLUG]],
+    [f'/profile/{USERNAME}/rss/', 'profile_rss', [USERNAME]],
+    [f'/profile/{USERNAME}/atom/', 'profile_atom', [USERNAME]],
     [f'/group/{SLUG}/', 'group', [SLUG]],
     [f'/profile/{USERNAME}/', 'profile', [USERNAME]],
+    [f'/profile/{USERNAME}/export/', 'profile_export', [USERNAME]],
     [f'/{app_name}/{POST_ID}/', 'post_detail', [POST_ID]],
+    [f'/{app_name}/{POST_ID}/comments/', 'post_comments', [POST_ID]],
     ['/create/', 'post_create', []],
     [f'/{app_name}/{POST_ID}/edit/', 'post_edit', [POST_ID]],
     [f'/{app_name}/{POST_ID}/comment/', 'add_comment', [POST_ID]],
     ['/follow/', 'follow_index', []],
     [f'/profile/{USERNAME}/follow/', 'profile_follow', [USERNAME]],
     [f'/profile/{USERNAME}/unfollow/', 'profile_unfollow', [USERNAME]],
+    ['/api/', 'api_index', []],
+    [f'/api/group/{SLUG}/', 'api_group', [SLUG]],
+    [f'/api/profile/{USERNAME}/', 'api_profile', [USERNAME]],
+    [f'/api/{app_name}/', 'api_posts', []],
+    [f'/api/{app_name}/{POST_ID}/', 'api_post_detail', [POST_ID]],
+    ['/api/follow/', 'api_follow_index', []],
 ]
 
 
@@ -11,16 +11,19 @@ SLUG = 'test_slug'
 INDEX_URL = reverse(f'{app_name}:index')
 GROUP_URL = reverse(f'{app_name}:group', args=[SLUG])
 PROFILE_URL = reverse(f'{app_name}:profile', args=[USERNAME])
+SEARCH_URL = reverse(f'{app_name}:search')
 LOGIN_URL = reverse('users:login')
 POST_CREATE_URL = reverse(f'{app_name}:post_create')
 FOLLOW_INDEX_URL = reverse(f'{app_name}:follow_index')
 FOLLOW_URL = reverse(f'{app_name}:profile_follow', args=[USERNAME])
 UNFOLLOW_URL = reverse(f'{app_name}:profile_unfollow', args=[USERNAME])
+EXPORT_URL = reverse(f'{app_name}:profile_export', args=[USERNAME])
 PAGE_NOT_FOUND_URL = '/unexisting_page/'
 REDIRECT_CREATE_POST_URL = f'{LOGIN_URL}?next={POST_CREATE_URL}'
 REDIRECT_FOLLOW_INDEX_URL = f'{LOGIN_URL}?next={FOLLOW_INDEX_URL}'
 REDIRECT_FOLLOW_URL = f'{LOGIN_URL}?next={FOLLOW_URL}'
 REDIRECT_UNFOLLOW_URL = f'{LOGIN_URL}?next={UNFOLLOW_URL}'
+REDIRECT_EXPORT_URL = f'{LOGIN_URL}?next={EXPORT_URL}'
 
 
 class PostRLTests(TestCase):
@@ -62,6 +65,7 @@ class PostRLTests(TestCase):
             [POST_CREATE_URL, self.author, 'post_create.html'],
             [self.POST_EDIT_URL, self.author, 'post_create.html'],
             [FOLLOW_INDEX_URL, self.another, 'follow.html'],
+            [f'{SEARCH_URL}?q=text', self.guest, 'search.html'],
 
         ]
         for url, client, template in CASES:
@@ -79,7 +83,9 @@ class PostRLTests(TestCase):
             [FOLLOW_URL, self.another, PROFILE_URL],
             [FOLLOW_URL, self.author, PROFILE_URL],
             [UNFOLLOW_URL, self.guest, REDIRECT_UNFOLLOW_URL],
-            [UNFOLLOW_URL, self.another, PROFILE_URL]
+            [UNFOLLOW_URL, self.another, PROFILE_URL],
+            [EXPORT_URL, self.guest, REDIRECT_EXPORT_URL],
+            [EXPORT_URL, self.another, PROFILE_URL],
         ]
 
         for url, client, redirect in CASES:
@@ -91,6 +97,7 @@ class PostRLTests(TestCase):
             [INDEX_URL, self.guest, 200],
             [GROUP_URL, self.guest, 200],
             [PROFILE_URL, self.guest, 200],
+            [SEARCH_URL, self.guest, 200],
             [POST_CREATE_URL, self.guest, 302],
             [POST_CREATE_URL, self.another, 200],
             [self.POST_DETAIL_URL, self.guest, 200],
@@ -106,6 +113,9 @@ class PostRLTests(TestCase):
             [UNFOLLOW_URL, self.guest, 302],
             [UNFOLLOW_URL, self.another, 302],
             [UNFOLLOW_URL, self.author, 404],
+            [EXPORT_URL, self.guest, 302],
+            [EXPORT_URL, self.another, 302],
+            [EXPORT_URL, self.author, 200],
 
         ]
 
@@ -1,10 +1,32 @@
-from django.test import Client, TestCase
+import json
+from io import BytesIO
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
 from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageCms
 
-from posts.models import Comment, Follow, Group, Post, User
+from core import tasks
+from posts import (counters, feed_cache, feeds, group_stats, search,
+                   thumbnails, uploads, variants, write_behind)
+from posts.forms import PostForm
+from posts.models import (Comment, FeedItem, Follow, Group, Post, PostCounters,
+                          StoredImage, User, UserCounters)
+from posts.storage import file_hash, hashed_name
 from posts.urls import app_name
-from yatube.settings import POST_PER_PAGE
+from yatube.settings import (API_BATCH_SIZE, COMMENTS_PER_PAGE,
+                             EXPORT_CHUNK_SIZE, POST_PER_PAGE)
 
 
 USERNAME = 'test_user'
@@ -24,11 +46,56 @@ PROFILE_PAGE_2_URL = f'{PROFILE_URL}?page=2'
 POST_CREATE_URL = reverse(f'{app_name}:post_create')
 FOLLOW_INDEX_URL = reverse(f'{app_name}:follow_index')
 FOLLOW_INDEX_PAGE_2_URL = f'{FOLLOW_INDEX_URL}?page=2'
+SEARCH_URL = reverse(f'{app_name}:search')
+GROUP_LIST_URL = reverse(f'{app_name}:group_list')
+CURSOR_URLS = [
+    f'{url}?cursor=' for url in (
+        INDEX_URL, GROUP_URL, PROFILE_URL, FOLLOW_INDEX_URL)
+]
 FOLLOW_URL = reverse(f'{app_name}:profile_follow', args=[AUTHOR])
 UNFOLLOW_URL = reverse(f'{app_name}:profile_unfollow', args=[AUTHOR])
+EXPORT_URL = reverse(f'{app_name}:profile_export', args=[AUTHOR])
+API_INDEX_URL = reverse(f'{app_name}:api_index')
+API_GROUP_URL = reverse(f'{app_name}:api_group', args=[SLUG])
+API_PROFILE_URL = reverse(f'{app_name}:api_profile', args=[AUTHOR])
+API_FOLLOW_URL = reverse(f'{app_name}:api_follow_index')
+API_POSTS_URL = reverse(f'{app_name}:api_posts')
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+# Потолок SQL-запросов на страницу: сессия, пользователь, сама страница
+# и, кроме главной и ленты подписок, версия содержимого для ETag
+QUERY_BUDGETS = {
+    INDEX_URL: 4,
+    GROUP_URL: 6,
+    PROFILE_URL: 7,
+    FOLLOW_INDEX_URL: 4,
+}
+POST_DETAIL_QUERY_BUDGET = 5
+GROUP_LIST_QUERY_BUDGET = 2
+# Страница JSON API или пакет постов — один запрос без сборки моделей
+API_QUERY_BUDGET = 1
+
+
+class QueryBudgetMixin:
+    """Проверка, что код укладывается в фиксированное число запросов."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        self.assertLessEqual(
+            len(context), budget,
+            '\n'.join(query['sql'] for query in context.captured_queries))
 
 
-class PostViewTest(TestCase):
+class PostViewTest(QueryBudgetMixin, TestCase):
     @classmethod
     def setUpClass(cls) -> None:
         super().setUpClass()
@@ -123,6 +190,8 @@ class PostViewTest(TestCase):
                 group=self.group,
             ) for i in range(POST_PER_PAGE + POST_LAST_PAGE)
         )
+        # bulk_create не отправляет сигналы, ленты собираем вручную
+        feeds.rebuild()
 
         url_pages = {
             INDEX_URL: POST_PER_PAGE,
@@ -141,14 +210,144 @@ class PostViewTest(TestCase):
                     len(self.another.get(url).context['page_obj']),
                     post_per_page)
 
-    def test_cache(self):
-        content = self.client.get(INDEX_URL).content
+    def test_cursor_paginator(self):
         Post.objects.all().delete()
-        content_after_delete = self.client.get(INDEX_URL).content
-        self.assertEqual(content, content_after_delete)
+        Post.objects.bulk_create(
+            Post(
+                text=f'test post {i}',
+                author=self.author_user,
+                group=self.group,
+            ) for i in range(POST_PER_PAGE + POST_LAST_PAGE)
+        )
+        # bulk_create не отправляет сигналы, ленты собираем вручную
+        feeds.rebuild()
+        posts = list(Post.objects.order_by('-pub_date', '-id'))
+        for url in CURSOR_URLS:
+            with self.subTest(url=url):
+                first_page = self.another.get(url).context['page_obj']
+                self.assertEqual(
+                    list(first_page), posts[:POST_PER_PAGE])
+                self.assertFalse(first_page.has_previous())
+                last_page = self.another.get(
+                    f'{url}{first_page.next_cursor}').context['page_obj']
+                self.assertEqual(
+                    list(last_page), posts[POST_PER_PAGE:])
+                self.assertFalse(last_page.has_next())
+                previous_page = self.another.get(
+                    f'{url}{last_page.previous_cursor}').context['page_obj']
+                self.assertEqual(list(previous_page), list(first_page))
+
+    def test_cursor_paginator_broken_cursor(self):
+        page = self.guest.get(
+            f'{INDEX_URL}?cursor=broken').context['page_obj']
+        self.assertEqual(list(page), [self.post])
+
+    def test_search(self):
+        relevant = Post.objects.create(
+            text='Котики котики и собаки', author=self.author_user)
+        other = Post.objects.create(
+            text='Котики спят', author=self.author_user)
+        Post.objects.create(text='Собаки гуляют', author=self.author_user)
+        for use_fts in (True, False):
+            with self.subTest(use_fts=use_fts), mock.patch(
+                    'posts.search.use_fts', return_value=use_fts):
+                search.rebuild()
+                self.assertEqual(
+                    list(self.guest.get(
+                        SEARCH_URL, {'q': 'КОТИКИ'}).context['page_obj']),
+                    [relevant, other])
+                self.assertEqual(
+                    list(self.guest.get(
+                        SEARCH_URL, {'q': 'котики собаки'}
+                    ).context['page_obj']),
+                    [relevant])
+                other.text = 'Спят'
+                other.save()
+                self.assertEqual(
+                    list(self.guest.get(
+                        SEARCH_URL, {'q': 'котики'}).context['page_obj']),
+                    [relevant])
+                relevant.delete()
+                self.assertEqual(
+                    len(self.guest.get(
+                        SEARCH_URL, {'q': 'котики'}).context['page_obj']),
+                    0)
+                relevant.save()
+                other.text = 'Котики спят'
+                other.save()
+
+    def test_search_paginator_keeps_query(self):
+        Post.objects.bulk_create(
+            Post(text=f'test post {i}', author=self.author_user)
+            for i in range(POST_PER_PAGE)
+        )
+        search.rebuild()
+        response = self.guest.get(SEARCH_URL, {'q': 'post'})
+        self.assertEqual(len(response.context['page_obj']), POST_PER_PAGE)
+        self.assertIn('href="?q=post&amp;page=2"', response.content.decode())
+
+    def test_search_ignores_cursor(self):
+        # курсор по дате перемешал бы выдачу, отсортированную по рангу
+        best = Post.objects.create(
+            text='котики котики', author=self.author_user)
+        Post.objects.create(text='котики', author=self.author_user)
+        search.rebuild()
+        by_rank = list(self.guest.get(
+            SEARCH_URL, {'q': 'котики'}).context['page_obj'])
+        page = self.guest.get(
+            SEARCH_URL, {'q': 'котики', 'cursor': ''}).context['page_obj']
+        self.assertFalse(getattr(page.paginator, 'cursor_mode', False))
+        self.assertEqual(list(page), by_rank)
+        self.assertEqual(by_rank[0], best)
+
+    def test_cache(self):
+        for url, client in [
+            [INDEX_URL, self.guest],
+            [FOLLOW_INDEX_URL, self.another],
+        ]:
+            with self.subTest(url=url):
+                content = client.get(url).content
+                # update() не отправляет сигналы и не меняет поколение
+                Post.objects.filter(id=self.post.id).update(text='Changed')
+                content_after_update = client.get(url).content
+                self.assertEqual(content, content_after_update)
+                cache.clear()
+                content_after_clear = client.get(url).content
+                self.assertNotEqual(content_after_update, content_after_clear)
+                Post.objects.filter(id=self.post.id).update(
+                    text=self.post.text)
+                cache.clear()
+
+    def test_cache_invalidation(self):
+        CASES = [
+            [INDEX_URL, self.guest],
+            [FOLLOW_INDEX_URL, self.another],
+        ]
+        contents = [client.get(url).content for url, client in CASES]
+        Post.objects.create(text='Fresh post', author=self.author_user)
+        for (url, client), content in zip(CASES, contents):
+            with self.subTest(url=url):
+                content_after_create = client.get(url).content
+                self.assertNotEqual(content, content_after_create)
+                self.assertIn('Fresh post', content_after_create.decode())
+
+    def test_cache_varies_on_page_and_user(self):
+        Post.objects.bulk_create(
+            Post(text=f'test post {i}', author=self.author_user)
+            for i in range(POST_PER_PAGE)
+        )
+        feeds.rebuild()
         cache.clear()
-        content_after_clear = self.client.get(INDEX_URL).content
-        self.assertNotEqual(content_after_delete, content_after_clear)
+        self.assertNotEqual(
+            self.guest.get(INDEX_URL).content,
+            self.guest.get(INDEX_PAGE_2_URL).content)
+        last_post_text = f'test post {POST_PER_PAGE - 1}'
+        self.assertIn(
+            last_post_text,
+            self.another.get(FOLLOW_INDEX_URL).content.decode())
+        self.assertNotIn(
+            last_post_text,
+            self.author.get(FOLLOW_INDEX_URL).content.decode())
 
     def test_follow(self):
         Follow.objects.all().delete()
@@ -162,3 +361,890 @@ class PostViewTest(TestCase):
         self.another.get(UNFOLLOW_URL)
         self.assertFalse(Follow.objects.filter(
             user=self.another_user, author=self.author_user).exists())
+
+    def test_feed_fan_out(self):
+        new_post = Post.objects.create(
+            text='Test fan out', author=self.author_user)
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.another_user, post=new_post,
+            pub_date=new_post.pub_date).exists())
+        self.assertFalse(FeedItem.objects.filter(
+            user=self.author_user, post=new_post).exists())
+
+    def test_feed_rebuild_joins_follows_once(self):
+        Follow.objects.create(user=self.author_user, author=self.author_user)
+        for user_ids in (None, [self.another_user.id]):
+            with self.subTest(user_ids=user_ids):
+                with CaptureQueriesContext(connection) as context:
+                    feeds.rebuild(user_ids)
+                select = next(
+                    query['sql'] for query in context.captured_queries
+                    if query['sql'].startswith('SELECT DISTINCT'))
+                self.assertEqual(select.count('JOIN "posts_follow"'), 1)
+                self.assertEqual(
+                    list(self.another_user.feed_items.values_list(
+                        'post', flat=True)), [self.post.id])
+
+    def test_feed_backfill_and_trim(self):
+        self.another.get(UNFOLLOW_URL)
+        self.assertFalse(self.another_user.feed_items.exists())
+        self.another.get(FOLLOW_URL)
+        self.assertEqual(
+            list(self.another_user.feed_items.values_list(
+                'post', flat=True)),
+            [self.post.id])
+
+    def test_export(self):
+        Post.objects.create(text='Второй пост', author=self.author_user)
+        response = self.author.get(EXPORT_URL)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('attachment', response['Content-Disposition'])
+        posts = [
+            json.loads(line) for line in
+            b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [post['text'] for post in posts],
+            [self.post.text, 'Второй пост'])
+        self.assertEqual(posts[0]['group'], SLUG)
+        self.assertEqual(posts[0]['comments'], [{
+            'author': USERNAME,
+            'text': self.comment.text,
+            'created': self.comment.created.isoformat(),
+        }])
+        self.assertEqual(posts[1]['comments'], [])
+
+    def test_export_streams_many_comments(self):
+        second = Post.objects.create(
+            text='Второй пост', author=self.author_user)
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.another_user, text=f'{number}')
+            for number in range(EXPORT_CHUNK_SIZE * 2)
+            for post in (self.post, second))
+        pieces = list(self.author.get(EXPORT_URL).streaming_content)
+        self.assertGreater(len(pieces), 2)
+        posts = [
+            json.loads(line)
+            for line in b''.join(pieces).decode().splitlines()]
+        self.assertEqual(
+            [len(post['comments']) for post in posts],
+            [EXPORT_CHUNK_SIZE * 2 + 1, EXPORT_CHUNK_SIZE * 2])
+        self.assertEqual(posts[1]['comments'][-1]['text'],
+                         str(EXPORT_CHUNK_SIZE * 2 - 1))
+
+    def test_export_queries_per_chunk(self):
+        Post.objects.bulk_create(
+            Post(text=f'post {i}', author=self.author_user)
+            for i in range(EXPORT_CHUNK_SIZE * 2))
+        response = self.author.get(EXPORT_URL)
+        # по запросу комментариев на каждую из трёх порций постов
+        with self.assertNumQueries(4):
+            lines = list(response.streaming_content)
+        self.assertEqual(len(lines), EXPORT_CHUNK_SIZE * 2 + 1)
+
+    def test_query_budget(self):
+        for page_size in (1, POST_PER_PAGE):
+            Post.objects.all().delete()
+            Post.objects.bulk_create(
+                Post(
+                    text=f'test post {i}',
+                    author=self.author_user,
+                    group=self.group,
+                ) for i in range(page_size)
+            )
+            feeds.rebuild()
+            counters.recount()
+            post = Post.objects.first()
+            Comment.objects.bulk_create(
+                Comment(post=post, author=self.another_user, text='text')
+                for _ in range(page_size))
+            cases = list(QUERY_BUDGETS.items()) + [[
+                reverse(f'{app_name}:post_detail', args=[post.id]),
+                POST_DETAIL_QUERY_BUDGET]]
+            for url, budget in cases:
+                with self.subTest(url=url, page_size=page_size):
+                    cache.clear()
+                    with self.assertQueryBudget(budget):
+                        self.assertEqual(
+                            self.another.get(url).status_code, 200)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = Post.objects.create(
+            text='Test text post',
+            author=User.objects.create(username=AUTHOR),
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF,
+                content_type='image/gif'),
+        )
+        cls.POST_DETAIL_URL = reverse(
+            f'{app_name}:post_detail', args=[cls.post.id])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(IMAGE_WORKERS=2)
+    def test_placeholder_until_thumbnail_ready(self):
+        with mock.patch('posts.thumbnails._pending', {}), \
+                mock.patch('posts.thumbnails.get_executor') as executor:
+            content = self.client.get(self.POST_DETAIL_URL).content.decode()
+        executor.return_value.submit.assert_called_once_with(
+            mock.ANY, self.post.image.name)
+        self.assertIn('bg-light', content)
+        self.assertNotIn('<img class="card-img', content)
+
+    @override_settings(IMAGE_WORKERS=2)
+    def test_finished_thumbnail_refreshes_feeds(self):
+        with mock.patch('posts.thumbnails._pending', {}), \
+                mock.patch('posts.thumbnails.get_executor') as executor:
+            self.client.get(INDEX_URL)
+            future = executor.return_value.submit.return_value
+            future.exception.return_value = None
+            stale = {
+                feed: feed_cache.generation(feed)
+                for feed in (feed_cache.INDEX_FEED,
+                             feed_cache.post_page(self.post.id))
+            }
+            done, = future.add_done_callback.call_args[0]
+            done(future)
+        for feed, version in stale.items():
+            with self.subTest(feed=feed):
+                self.assertNotEqual(feed_cache.generation(feed), version)
+
+    @override_settings(IMAGE_WORKERS=0)
+    def test_ready_matches_get_thumbnail(self):
+        thumbnail = thumbnails.make(self.post.image.name)
+        self.assertEqual(
+            thumbnails.ready(self.post.image).name, thumbnail.name)
+
+    @override_settings(IMAGE_WORKERS=0)
+    def test_thumbnail_in_feeds(self):
+        for url in (INDEX_URL, PROFILE_URL, self.POST_DETAIL_URL):
+            with self.subTest(url=url):
+                self.assertIn(
+                    '<img class="card-img my-2" src="/media/cache/',
+                    self.client.get(url).content.decode())
+
+
+def wide_jpeg(width=1000, height=400):
+    content = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(content, 'JPEG')
+    return SimpleUploadedFile(
+        name='wide.jpg', content=content.getvalue(),
+        content_type='image/jpeg')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_WORKERS=0,
+    POST_IMAGE_FORMATS=('webp', 'jpeg'))
+class ImageVariantsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author_user = User.objects.create(username=AUTHOR)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='text', author=self.author_user, image=wide_jpeg())
+
+    def test_variants_per_width_and_format(self):
+        variants.make(self.post.id, self.post.image.name)
+        self.post.refresh_from_db()
+        built = json.loads(self.post.image_variants)
+        # 1440 шире оригинала и не строится
+        self.assertEqual(
+            [(format_, width) for format_, width, _ in built],
+            [('webp', 480), ('jpeg', 480), ('webp', 960), ('jpeg', 960)])
+        for format_, width, path in built:
+            with self.subTest(path=path):
+                with Image.open(f'{TEMP_MEDIA_ROOT}/{path}') as image:
+                    self.assertEqual(image.format, format_.upper())
+                    self.assertEqual(image.size, variants.frame(width))
+
+    def test_small_image_gets_narrowest_variant(self):
+        post = Post.objects.create(
+            text='text', author=self.author_user, image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF,
+                content_type='image/gif'))
+        variants.make(post.id, post.image.name)
+        post.refresh_from_db()
+        self.assertEqual(
+            {width for _, width, _ in json.loads(post.image_variants)},
+            {480})
+
+    def test_picture_markup(self):
+        variants.make(self.post.id, self.post.image.name)
+        for url in (INDEX_URL, PROFILE_URL, reverse(
+                f'{app_name}:post_detail', args=[self.post.id])):
+            with self.subTest(url=url):
+                content = self.client.get(url).content.decode()
+                self.assertIn('<source type="image/webp" srcset=', content)
+                self.assertRegex(
+                    content,
+                    r'<img class="card-img my-2" src="[^"]+-960\.jpg"')
+                self.assertIn('480w', content)
+
+    def test_broken_variants_fall_back_to_thumbnail(self):
+        broken = ('not json', '{}', '[["webp", 480]]', '[["gif", 1, "x"]]')
+        for value in broken:
+            with self.subTest(value=value):
+                cache.clear()
+                Post.objects.filter(pk=self.post.pk).update(
+                    image_variants=value)
+                self.assertEqual(variants.parse(value), [])
+                response = self.client.get(INDEX_URL)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, '<picture>')
+
+    def test_new_image_resets_variants(self):
+        variants.make(self.post.id, self.post.image.name)
+        self.post.refresh_from_db()
+        form = PostForm(
+            {'text': 'text'}, files={'image': wide_jpeg(600, 300)},
+            instance=self.post)
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_variants, '')
+
+
+def rotated_jpeg(width=2400, height=2000):
+    """JPEG с EXIF: повернуть на 90° при показе."""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010f] = 'Camera'
+    content = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(
+        content, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(
+        name='photo.jpg', content=content.getvalue(),
+        content_type='image/jpeg')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_WORKERS=0,
+    POST_IMAGE_FORMATS=('jpeg',), POST_IMAGE_MAX_SIDE=1200)
+class UploadNormalizationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author_user = User.objects.create(username=AUTHOR)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author_user)
+
+    def create(self, image):
+        """Пост из формы и обработка, которую форма ставит в on_commit."""
+        self.client.post(reverse(f'{app_name}:post_create'), {
+            'text': 'text', 'image': image})
+        post = Post.objects.latest('id')
+        self.raw_name = post.image.name
+        uploads.enqueue(post)
+        post.refresh_from_db()
+        return post
+
+    def test_photo_rotated_downsized_and_stripped(self):
+        post = self.create(rotated_jpeg())
+        self.assertNotEqual(post.image.name, self.raw_name)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (1000, 1200))
+            self.assertFalse(image.getexif())
+        self.assertEqual(
+            {width for _, width, _ in json.loads(post.image_variants)},
+            {480, 960})
+        self.assertEqual(
+            StoredImage.objects.get(name=post.image.name).refs, 1)
+
+    def test_normalized_path(self):
+        first = self.create(rotated_jpeg())
+        second = self.create(rotated_jpeg())
+        with first.image.open() as image:
+            self.assertEqual(first.image.name, hashed_name(
+                'posts/photo.jpg', file_hash(image)))
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(
+            StoredImage.objects.get(name=first.image.name).refs, 2)
+
+    def test_raw_upload_collected(self):
+        post = self.create(rotated_jpeg())
+        raw = StoredImage.objects.get(name=self.raw_name)
+        self.assertEqual(raw.refs, 0)
+        tasks.run_pending()
+        self.assertFalse(StoredImage.objects.filter(pk=raw.pk).exists())
+        self.assertFalse(uploads.images.storage().exists(raw.name))
+        self.assertTrue(uploads.images.storage().exists(post.image.name))
+
+    def test_gif_kept_as_uploaded(self):
+        post = self.create(SimpleUploadedFile(
+            name='small.gif', content=SMALL_GIF, content_type='image/gif'))
+        self.assertEqual(post.image.name, self.raw_name)
+        with post.image.open() as image:
+            self.assertEqual(image.read(), SMALL_GIF)
+
+    def test_animation_kept_as_uploaded(self):
+        content = BytesIO()
+        frames = [Image.new('RGB', (2000, 1000), color)
+                  for color in ('red', 'blue')]
+        frames[0].save(
+            content, 'WEBP', save_all=True, append_images=frames[1:])
+        post = self.create(SimpleUploadedFile(
+            name='anim.webp', content=content.getvalue(),
+            content_type='image/webp'))
+        self.assertEqual(post.image.name, self.raw_name)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.n_frames, 2)
+
+    def test_color_profile_kept(self):
+        profile = ImageCms.ImageCmsProfile(
+            ImageCms.createProfile('sRGB')).tobytes()
+        content = BytesIO()
+        Image.new('RGB', (2000, 1000), 'red').save(
+            content, 'JPEG', icc_profile=profile)
+        post = self.create(SimpleUploadedFile(
+            name='wide.jpg', content=content.getvalue(),
+            content_type='image/jpeg'))
+        self.assertNotEqual(post.image.name, self.raw_name)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (1200, 600))
+            self.assertEqual(image.info.get('icc_profile'), profile)
+
+    def test_replaced_image_not_switched(self):
+        post = Post.objects.create(
+            text='text', author=self.author_user, image=rotated_jpeg())
+        name = post.image.name
+        Post.objects.filter(pk=post.pk).update(image='posts/other.jpg')
+        self.assertIsNone(uploads.replace(post.id, name))
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, 'posts/other.jpg')
+        self.assertEqual(
+            StoredImage.objects.filter(refs=0).count(), 1)
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_MB=0.001)
+    def test_oversize_upload_rejected(self):
+        form = PostForm({'text': 'text'}, files={'image': rotated_jpeg()})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+
+class SyndicationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username=AUTHOR)
+        cls.group = Group.objects.create(
+            title='title test', slug=SLUG, description='description')
+        cls.post = Post.objects.create(
+            text='Test syndication post', author=cls.author, group=cls.group)
+        # запросов на 304: дата свежего поста и, кроме главной, объект ленты
+        cls.FEED_URLS = {
+            reverse(f'{app_name}:{name}_{kind}', args=args): [
+                content_type, queries]
+            for name, args, queries in (
+                ('index', [], 1), ('group', [SLUG], 2),
+                ('profile', [AUTHOR], 2))
+            for kind, content_type in (
+                ('rss', 'application/rss+xml; charset=utf-8'),
+                ('atom', 'application/atom+xml; charset=utf-8'))
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds(self):
+        for url, [content_type, _] in self.FEED_URLS.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertIn(self.post.text, response.content.decode())
+                self.assertIn('ETag', response)
+                self.assertIn('Last-Modified', response)
+
+    def test_not_modified(self):
+        for url, [_, queries] in self.FEED_URLS.items():
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_new_post_refreshes_feed(self):
+        for url in self.FEED_URLS:
+            self.client.get(url)
+        new_post = Post.objects.create(
+            text='Fresh syndication post', author=self.author,
+            group=self.group)
+        for url in self.FEED_URLS:
+            with self.subTest(url=url):
+                self.assertIn(
+                    new_post.text, self.client.get(url).content.decode())
+
+    def test_moved_post_leaves_old_group_feed(self):
+        other = Group.objects.create(
+            title='other', slug=ANOTHER_SLUG, description='description')
+        urls = [
+            reverse(f'{app_name}:group_{kind}', args=[SLUG])
+            for kind in ('rss', 'atom')
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other
+        post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn(self.post.text, response.content.decode())
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author_user = User.objects.create(username=AUTHOR)
+        cls.viewer = User.objects.create(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='title test', slug=SLUG, description='description')
+        cls.post = Post.objects.create(
+            text='Test conditional post', author=cls.author_user,
+            group=cls.group)
+        cls.POST_DETAIL_URL = reverse(
+            f'{app_name}:post_detail', args=[cls.post.id])
+        cls.URLS = [
+            INDEX_URL, INDEX_PAGE_2_URL, GROUP_URL, PROFILE_URL,
+            cls.POST_DETAIL_URL]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.viewer)
+
+    def test_not_modified(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertTemplateNotUsed(response, 'base.html')
+
+    def test_new_csrf_token_refreshes_etag(self):
+        etag = self.client.get(self.POST_DETAIL_URL)['ETag']
+        self.assertEqual(self.client.get(
+            self.POST_DETAIL_URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # вход заново меняет CSRF-токен формы комментария
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+        self.assertEqual(self.client.get(
+            self.POST_DETAIL_URL, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_differs_per_user_and_page(self):
+        etags = {self.client.get(url)['ETag'] for url in self.URLS}
+        self.client.force_login(self.author_user)
+        etags |= {self.client.get(url)['ETag'] for url in self.URLS}
+        self.assertEqual(len(etags), len(self.URLS) * 2)
+
+    def test_changes_refresh_etag(self):
+        cases = [
+            [self.POST_DETAIL_URL, lambda: Comment.objects.create(
+                post=self.post, author=self.viewer, text='comment')],
+            [PROFILE_URL, lambda: self.client.get(FOLLOW_URL)],
+            [PROFILE_URL, lambda: Comment.objects.create(
+                post=self.post, author=self.author_user, text='comment')],
+            [GROUP_URL, lambda: Post.objects.create(
+                text='new', author=self.viewer, group=self.group)],
+            [INDEX_URL, lambda: self.post.save()],
+        ]
+        for url, change in cases:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                change()
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_objects(self):
+        for url in (
+            reverse(f'{app_name}:group', args=['missing']),
+            reverse(f'{app_name}:profile', args=['missing']),
+            reverse(f'{app_name}:post_detail', args=[self.post.id + 1]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(IMAGE_WORKERS=2)
+    def test_no_etag_while_thumbnail_pending(self):
+        self.post.image = 'posts/missing.gif'
+        self.post.save()
+        with mock.patch('posts.thumbnails._pending', {}), \
+                mock.patch('posts.thumbnails.get_executor'), \
+                mock.patch('posts.thumbnails.ready', return_value=None):
+            response = self.client.get(self.POST_DETAIL_URL)
+        self.assertNotIn('ETag', response)
+
+    @override_settings(IMAGE_WORKERS=2)
+    def test_ready_thumbnail_refreshes_cached_placeholder_etag(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = 'posts/missing.gif'
+        post.save()
+        with mock.patch('posts.thumbnails._pending', {}), \
+                mock.patch('posts.thumbnails.get_executor') as executor, \
+                mock.patch('posts.thumbnails.ready', return_value=None):
+            self.client.get(INDEX_URL)
+            # заглушка взята из кэша фрагментов, тег не выполнялся
+            etag = self.client.get(INDEX_URL)['ETag']
+            future = executor.return_value.submit.return_value
+            future.exception.return_value = None
+            done, = future.add_done_callback.call_args[0]
+            done(future)
+        self.assertEqual(self.client.get(
+            INDEX_URL, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_moved_post_refreshes_old_group_etag(self):
+        other = Group.objects.create(
+            title='other', slug=ANOTHER_SLUG, description='description')
+        etag = self.client.get(GROUP_URL)['ETag']
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other
+        post.save()
+        response = self.client.get(GROUP_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(self.post.text, response.content.decode())
+
+
+class GroupListTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author_user = User.objects.create(username=AUTHOR)
+        cls.quiet = Group.objects.create(
+            title='a quiet', slug=SLUG, description='description')
+        cls.busy = Group.objects.create(
+            title='b busy', slug=ANOTHER_SLUG, description='description')
+        old = Post.objects.create(
+            text='old', author=cls.author_user, group=cls.quiet)
+        # давний пост учитывается в общем числе, но не в популярности
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - timedelta(days=30))
+        group_stats.recount()
+        for number in range(2):
+            Post.objects.create(
+                text=f'busy {number}', author=cls.author_user,
+                group=cls.busy)
+
+    def page_groups(self, url=GROUP_LIST_URL):
+        return list(self.client.get(url).context['page_obj'])
+
+    def test_stats_follow_posts(self):
+        post = Post.objects.create(
+            text='moved', author=self.author_user, group=self.busy)
+        post.group = self.quiet
+        post.save()
+        Post.objects.filter(group=self.busy).first().delete()
+        groups = {group.pk: group for group in self.page_groups()}
+        busy, quiet = groups[self.busy.pk], groups[self.quiet.pk]
+        self.assertEqual(
+            (busy.stats.posts, busy.posts_day, busy.posts_week), (1, 1, 1))
+        self.assertEqual(
+            (quiet.stats.posts, quiet.posts_day, quiet.posts_week), (2, 1, 1))
+        self.assertEqual(quiet.stats.last_post_at, post.pub_date)
+
+    def test_sorts(self):
+        cases = {
+            GROUP_LIST_URL: [self.busy, self.quiet],
+            f'{GROUP_LIST_URL}?sort=title': [self.quiet, self.busy],
+            f'{GROUP_LIST_URL}?sort=recent': [self.busy, self.quiet],
+            f'{GROUP_LIST_URL}?sort=unknown': [self.busy, self.quiet],
+        }
+        for url, expected in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.page_groups(url), expected)
+
+    def test_query_budget(self):
+        for number in range(POST_PER_PAGE):
+            Group.objects.create(
+                title=f'group {number}', slug=f'group-{number}')
+        with self.assertQueryBudget(GROUP_LIST_QUERY_BUDGET):
+            response = self.client.get(GROUP_LIST_URL)
+        self.assertEqual(len(response.context['page_obj']), POST_PER_PAGE)
+        self.assertContains(response, GROUP_URL)
+
+
+class CommentPaginationTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author_user = User.objects.create(username=AUTHOR)
+        cls.post = Post.objects.create(text='text', author=cls.author_user)
+        # одинаковое время создания: порядок держится на id
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author_user, text=f'c{i}')
+            for i in range(COMMENTS_PER_PAGE * 2 + 1))
+        cls.POST_DETAIL_URL = reverse(
+            f'{app_name}:post_detail', args=[cls.post.id])
+        cls.COMMENTS_URL = reverse(
+            f'{app_name}:post_comments', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_are_paginated(self):
+        with self.assertQueryBudget(POST_DETAIL_QUERY_BUDGET):
+            response = self.client.get(self.POST_DETAIL_URL)
+        page = response.context['comments']
+        comments = list(page)
+        while page.has_next():
+            response = self.client.get(
+                f'{self.COMMENTS_URL}?cursor={page.next_cursor}')
+            self.assertTemplateNotUsed(response, 'base.html')
+            page = response.context['comments']
+            self.assertLessEqual(len(page), COMMENTS_PER_PAGE)
+            comments += page
+        self.assertEqual(
+            comments,
+            list(Comment.objects.filter(post=self.post).order_by(
+                '-created', '-id')))
+
+    def test_fragment_link(self):
+        page = self.client.get(self.POST_DETAIL_URL).context['comments']
+        self.assertContains(
+            self.client.get(self.POST_DETAIL_URL),
+            f'{self.COMMENTS_URL}?cursor={page.next_cursor}')
+        self.assertEqual(self.client.get(reverse(
+            f'{app_name}:post_comments', args=[self.post.id + 1]
+        )).status_code, 404)
+
+
+class WriteBehindTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author_user = User.objects.create(username=AUTHOR)
+        cls.reader = User.objects.create(username=USERNAME)
+        cls.post = Post.objects.create(text='text', author=cls.author_user)
+        cls.POST_DETAIL_URL = reverse(
+            f'{app_name}:post_detail', args=[cls.post.id])
+        cls.COMMENT_URL = reverse(
+            f'{app_name}:add_comment', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        overrides = override_settings(
+            WRITE_BEHIND=True,
+            WRITE_BEHIND_PATH=f'{directory}/journal.sqlite3')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client.force_login(self.reader)
+
+    def test_comment_is_visible_before_flush(self):
+        etag = self.client.get(self.POST_DETAIL_URL)['ETag']
+        self.client.post(self.COMMENT_URL, {'text': 'queued comment'})
+        self.assertFalse(Comment.objects.exists())
+        response = self.client.get(
+            self.POST_DETAIL_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'queued comment')
+        self.assertNotContains(
+            Client().get(self.POST_DETAIL_URL), 'queued comment')
+        self.assertEqual(write_behind.flush(), 1)
+        self.assertEqual(Comment.objects.get().text, 'queued comment')
+        self.assertEqual(PostCounters.objects.get(post=self.post).comments, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.reader).comments, 1)
+        self.assertContains(
+            self.client.get(self.POST_DETAIL_URL), 'queued comment', count=1)
+        self.assertEqual(write_behind.flush(), 0)
+
+    def test_flush_keeps_comment_date(self):
+        self.client.post(self.COMMENT_URL, {'text': 'queued comment'})
+        queued = write_behind.pending_comments(self.post.id, self.reader)
+        with mock.patch(
+                'django.utils.timezone.now',
+                return_value=timezone.now() + timedelta(hours=1)):
+            write_behind.flush()
+        self.assertEqual(Comment.objects.get().created, queued[0].created)
+
+    def test_post_created_during_flush(self):
+        self.client.post(self.COMMENT_URL, {'text': 'queued comment'})
+        bulk_create = Comment.objects.bulk_create
+
+        def create_post_meanwhile(comments):
+            # запрос в другом потоке пишет пост, пока идёт сброс
+            Post.objects.create(text='during flush', author=self.reader)
+            return bulk_create(comments)
+
+        with mock.patch.object(
+                Comment.objects, 'bulk_create',
+                side_effect=create_post_meanwhile):
+            self.assertEqual(write_behind.flush(), 1)
+        self.assertIsNotNone(
+            Post.objects.get(text='during flush').pub_date)
+
+    def test_follow_is_visible_before_flush(self):
+        self.client.get(FOLLOW_URL)
+        self.assertFalse(Follow.objects.exists())
+        self.assertTrue(self.client.get(PROFILE_URL).context['following'])
+        write_behind.flush()
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author_user).exists())
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.reader, post=self.post).exists())
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author_user).followers, 1)
+
+    def test_unfollow_cancels_pending_follow(self):
+        self.client.get(FOLLOW_URL)
+        self.client.get(UNFOLLOW_URL)
+        self.assertFalse(self.client.get(PROFILE_URL).context['following'])
+        write_behind.flush()
+        self.assertFalse(Follow.objects.exists())
+
+    def test_flush_skips_stale_writes(self):
+        Follow.objects.create(user=self.reader, author=self.author_user)
+        self.client.get(FOLLOW_URL)
+        self.client.post(self.COMMENT_URL, {'text': 'queued comment'})
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(write_behind.flush(), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(
+            UserCounters.objects.get(user=self.reader).follows, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ApiTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author_user = User.objects.create(username=AUTHOR)
+        cls.reader = User.objects.create(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='title', slug=SLUG, description='description')
+        Post.objects.bulk_create(
+            Post(text=f'post {number}', author=cls.author_user,
+                 group=cls.group if number % 2 else None)
+            for number in range(POST_PER_PAGE + 3))
+        cls.post = Post.objects.create(
+            text='Текст', author=cls.author_user, group=cls.group,
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF,
+                content_type='image/gif'))
+        Follow.objects.create(user=cls.reader, author=cls.author_user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def collect(self, url):
+        results = []
+        cursor = ''
+        while cursor is not None:
+            data = self.client.get(f'{url}?cursor={cursor}').json()
+            self.assertLessEqual(len(data['results']), POST_PER_PAGE)
+            results += data['results']
+            cursor = data['next']
+        return [post['id'] for post in results]
+
+    def test_feeds_paginated_by_cursor(self):
+        self.client.force_login(self.reader)
+        posts = Post.objects.order_by('-pub_date', '-id')
+        cases = {
+            API_INDEX_URL: posts,
+            API_GROUP_URL: posts.filter(group=self.group),
+            API_PROFILE_URL: posts.filter(author=self.author_user),
+            API_FOLLOW_URL: posts.filter(author=self.author_user),
+        }
+        for url, expected in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.collect(url),
+                    list(expected.values_list('id', flat=True)))
+
+    def test_post_fields(self):
+        self.assertEqual(self.client.get(self.post_url()).json(), {
+            'id': self.post.id,
+            'text': 'Текст',
+            'pub_date': DjangoJSONEncoder().default(self.post.pub_date),
+            'author': AUTHOR,
+            'group': SLUG,
+            'image': self.post.image.url,
+            'comments': 0,
+        })
+
+    def test_sparse_fields_select_only_their_columns(self):
+        with self.assertQueryBudget(API_QUERY_BUDGET) as context:
+            data = self.client.get(
+                f'{API_INDEX_URL}?fields=author,id').json()
+        self.assertEqual(
+            data['results'][0], {'id': self.post.id, 'author': AUTHOR})
+        sql = context.captured_queries[-1]['sql']
+        self.assertNotIn('"text"', sql)
+        self.assertNotIn('"image"', sql)
+
+    def test_batch(self):
+        missing = self.post.id + 1
+        ids = [self.post.id, missing, self.post.id - 1, self.post.id]
+        with self.assertQueryBudget(API_QUERY_BUDGET):
+            data = self.client.get(
+                f'{API_POSTS_URL}?fields=id,text&'
+                f'ids={",".join(map(str, ids))}').json()
+        self.assertEqual(data, {
+            'results': [
+                {'id': self.post.id, 'text': 'Текст'},
+                {'id': self.post.id - 1, 'text': Post.objects.get(
+                    id=self.post.id - 1).text},
+            ],
+            'missing': [missing],
+        })
+
+    def test_errors(self):
+        cases = {
+            f'{API_INDEX_URL}?fields=text,password': 400,
+            f'{API_POSTS_URL}?ids=1,a': 400,
+            f'{API_POSTS_URL}?ids=' + ','.join(
+                map(str, range(API_BATCH_SIZE + 1))): 400,
+            reverse(f'{app_name}:api_group', args=[ANOTHER_SLUG]): 404,
+            reverse(f'{app_name}:api_profile', args=[USERNAME + 'x']): 404,
+            self.post_url(self.post.id + 1): 404,
+            API_FOLLOW_URL: 401,
+        }
+        for url, status in cases.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+
+    def test_not_modified(self):
+        response = self.client.get(API_INDEX_URL)
+        self.assertEqual(self.client.get(
+            API_INDEX_URL, HTTP_IF_NONE_MATCH=response['ETag']
+        ).status_code, 304)
+
+    def test_new_comment_changes_etag(self):
+        for url in (API_INDEX_URL, API_GROUP_URL, API_PROFILE_URL):
+            with self.subTest(url=url):
+                url = f'{url}?fields=id,comments'
+                etag = self.client.get(url)['ETag']
+                Comment.objects.create(
+                    post=self.post, author=self.reader, text='comment')
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def post_url(self, post_id=None):
+        return reverse(
+            f'{app_name}:api_post_detail', args=[post_id or self.post.id])
@@ -0,0 +1,121 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Миниатюры считаются в пуле процессов, чтобы ресайз Pillow не занимал
+поток запроса и использовал все ядра. Шаблоны берут только готовую
+миниатюру из хранилища sorl и до её появления показывают заглушку;
+когда миниатюра готова, ленты с постами этой картинки сбрасываются,
+иначе заглушка часами висела бы в кэше фрагментов.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import feed_cache
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+# Картинки в работе и посты, которые показали вместо них заглушку
+_pending = {}
+
+
+def _init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def make(name):
+    return get_thumbnail(
+        name,
+        settings.POST_THUMBNAIL_GEOMETRY,
+        **settings.POST_THUMBNAIL_OPTIONS)
+
+
+def generate(name):
+    """Создаёт миниатюру картинки поста; выполняется в процессе пула."""
+    try:
+        make(name)
+    finally:
+        connections.close_all()
+
+
+def _done(future):
+    # кэш лент живёт в процессе сервера, а не в процессе пула
+    posts = _pending.pop(future.image_name, [])
+    if future.exception():
+        logger.error(
+            'Не удалось создать миниатюру %s', future.image_name,
+            exc_info=future.exception())
+        return
+    for post in posts:
+        feed_cache.bump_post(post)
+
+
+def enqueue(name, post=None):
+    """Ставит миниатюру в очередь; без пула строит её сразу."""
+    if not name:
+        return
+    if name in _pending:
+        if post is not None:
+            _pending[name].append(post)
+        return
+    if not settings.IMAGE_WORKERS:
+        make(name)
+        return
+    _pending[name] = [] if post is None else [post]
+    future = get_executor().submit(generate, name)
+    future.image_name = name
+    future.add_done_callback(_done)
+
+
+def thumbnail_name(source):
+    """Имя миниатюры, которое get_thumbnail дал бы картинке source.
+
+    Найти миниатюру, не строя её, публичный API sorl не позволяет,
+    поэтому здесь повторяется разбор опций ThumbnailBackend.get_thumbnail
+    через его закрытые методы. Они есть в sorl-thumbnail 12.7, версия
+    закреплена в requirements.txt; совпадение имени с get_thumbnail
+    проверяет PostThumbnailTest.test_ready_matches_get_thumbnail.
+    """
+    backend = default.backend
+    options = dict(settings.POST_THUMBNAIL_OPTIONS)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return backend._get_thumbnail_filename(
+        source, settings.POST_THUMBNAIL_GEOMETRY, options)
+
+
+def ready(file_):
+    """Готовая миниатюра из хранилища sorl или None."""
+    if not file_:
+        return None
+    # ключ sorl зависит от хранилища: make строит миниатюру по имени
+    # в хранилище по умолчанию, по нему же её и ищем
+    name = thumbnail_name(ImageFile(file_.name))
+    return default.kvstore.get(ImageFile(name, default.storage))
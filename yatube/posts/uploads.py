@@ -0,0 +1,118 @@
+"""Обработка загруженных картинок постов вне запроса.
+
+Запрос сохраняет исходный файл как есть и сразу отвечает. Пул
+процессов миниатюр затем поворачивает картинку по EXIF, уменьшает
+её до POST_IMAGE_MAX_SIDE по большей стороне и перекодирует без
+EXIF, но с цветовым профилем, с качеством POST_IMAGE_UPLOAD_QUALITY.
+Анимированные картинки остаются как загружены. Пост переключается
+на новый файл, исходный освобождается (см. posts/images.py), после
+чего для итогового файла строятся миниатюра и варианты srcset.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from posts import feed_cache, images, thumbnails, variants
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые перекодируются; анимированные GIF и прочее
+# хранятся как загружены
+SAVE_OPTIONS = {
+    'JPEG': lambda quality: {
+        'quality': quality, 'optimize': True, 'progressive': True},
+    'PNG': lambda quality: {'optimize': True},
+    'WEBP': lambda quality: {'quality': quality},
+}
+
+
+def normalize(name):
+    """Перекодированная картинка name или None, если менять нечего."""
+    with images.storage().open(name) as source:
+        image = Image.open(source)
+        # перекодировка оставила бы от анимации первый кадр
+        if (image.format not in SAVE_OPTIONS
+                or getattr(image, 'is_animated', False)):
+            return None
+        format_ = image.format
+        stripped = bool(image.getexif())
+        # без профиля Display P3 или Adobe RGB браузер покажет цвета
+        # как sRGB
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        size = image.size
+        side = settings.POST_IMAGE_MAX_SIDE
+        image.thumbnail((side, side), Image.LANCZOS)
+        options = SAVE_OPTIONS[format_](settings.POST_IMAGE_UPLOAD_QUALITY)
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        content = BytesIO()
+        image.save(content, format_, **options)
+        # без EXIF и уменьшения перекодировка нужна, только если
+        # файл стал легче
+        if (not stripped and image.size == size
+                and content.tell() >= source.size):
+            return None
+    return ContentFile(content.getvalue())
+
+
+def replace(post_id, name):
+    """Переключает пост на нормализованный файл и возвращает его имя;
+    None, если картинку поста уже сменили."""
+    content = normalize(name)
+    if content is None:
+        return name
+    # имя по хешу строится от каталога загрузок, а не от каталога
+    # хеша исходного файла
+    normalized = images.storage().save(posixpath.join(
+        settings.MEDIA_POST_PATH, posixpath.basename(name)), content)
+    with transaction.atomic():
+        moved = Post.objects.filter(id=post_id, image=name).update(
+            image=normalized, image_variants='')
+        images.acquire(normalized)
+        # не понадобившийся посту новый файл сразу уходит сборщику
+        images.release(name if moved else normalized)
+    return normalized if moved else None
+
+
+def process(post_id, name):
+    """Нормализует загрузку и строит для неё миниатюру и варианты."""
+    name = replace(post_id, name)
+    if name is not None:
+        thumbnails.make(name)
+        variants.make(post_id, name)
+
+
+def generate(post_id, name):
+    """process для процесса пула."""
+    try:
+        process(post_id, name)
+    finally:
+        connections.close_all()
+
+
+def enqueue(post):
+    """Ставит обработку картинки поста в пул; без пула делает её сразу."""
+    if not post.image:
+        return
+    if not settings.IMAGE_WORKERS:
+        process(post.id, post.image.name)
+        feed_cache.bump_post(post)
+        return
+
+    def done(future):
+        # кэш лент живёт в процессе сервера, а не в процессе пула
+        if future.exception():
+            logger.error(
+                'Не удалось обработать картинку %s', post.image.name,
+                exc_info=future.exception())
+        else:
+            feed_cache.bump_post(post)
+    thumbnails.get_executor().submit(
+        generate, post.id, post.image.name).add_done_callback(done)
@@ -1,14 +1,30 @@
 from django.urls import path
 
-from . import views
+from . import api, syndication, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('rss/', syndication.IndexFeed(), name='index_rss'),
+    path('atom/', syndication.IndexAtomFeed(), name='index_atom'),
+    path('groups/', views.group_list, name='group_list'),
     path('group/<slug:slug>/', views.group_posts, name='group'),
+    path('group/<slug:slug>/rss/', syndication.GroupFeed(),
+         name='group_rss'),
+    path('group/<slug:slug>/atom/', syndication.GroupAtomFeed(),
+         name='group_atom'),
     path('profile/<username>/', views.profile, name='profile'),
+    path('profile/<str:username>/export/', views.profile_export,
+         name='profile_export'),
+    path('profile/<str:username>/rss/', syndication.ProfileFeed(),
+         name='profile_rss'),
+    path('profile/<str:username>/atom/', syndication.ProfileAtomFeed(),
+         name='profile_atom'),
+    path('search/', views.post_search, name='search'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -20,4 +36,11 @@ urlpatterns = [
     path('profile/<str:username>/unfollow/', views.profile_unfollow,
          name='profile_unfollow'
          ),
+    path('api/', api.index, name='api_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
+    path('api/posts/', api.posts, name='api_posts'),
+    path('api/posts/<int:post_id>/', api.post_detail,
+         name='api_post_detail'),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
 ]
@@ -0,0 +1,149 @@
+"""Адаптивные варианты картинок постов для srcset.
+
+После загрузки картинки пул процессов миниатюр режет её под кадр
+POST_THUMBNAIL_GEOMETRY в нескольких ширинах POST_IMAGE_WIDTHS и
+форматах POST_IMAGE_FORMATS и записывает список файлов в
+Post.image_variants. Тег post_picture строит по нему <picture>, и
+браузер сам выбирает самый лёгкий подходящий файл: телефону
+достаётся WebP шириной 480 вместо JPEG шириной 960.
+"""
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+from posts import images
+from posts.models import Post
+from posts.storage import is_hashed
+
+CONTENT_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+EXTENSIONS = {'jpeg': 'jpg'}
+
+
+def supported_formats():
+    Image.init()
+    return [
+        format_ for format_ in settings.POST_IMAGE_FORMATS
+        if format_.upper() in Image.SAVE
+    ]
+
+
+def geometry():
+    return tuple(map(int, settings.POST_THUMBNAIL_GEOMETRY.split('x')))
+
+
+def frame(width):
+    """Размер кадра миниатюры, приведённый к ширине width."""
+    frame_width, frame_height = geometry()
+    return width, round(width * frame_height / frame_width)
+
+
+def build(name):
+    """Сохраняет варианты картинки name; возвращает [формат, ширина, файл].
+    """
+    with default_storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    # крупнее оригинала не растягиваем, но самый узкий вариант нужен всегда
+    widths = [
+        width for width in sorted(settings.POST_IMAGE_WIDTHS)
+        if width <= image.width
+    ] or [min(settings.POST_IMAGE_WIDTHS)]
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = []
+    for width in widths:
+        resized = ImageOps.fit(image, frame(width), Image.LANCZOS)
+        for format_ in supported_formats():
+            path = (
+                f'{settings.MEDIA_POST_PATH}variants/{stem}-{width}.'
+                f'{EXTENSIONS.get(format_, format_)}')
+            # у картинки, названной по хешу, тот же файл — те же варианты
+            if is_hashed(name) and default_storage.exists(path):
+                variants.append([format_, width, path])
+                continue
+            content = BytesIO()
+            (resized.convert('RGB') if format_ == 'jpeg' else resized).save(
+                content, format_.upper(),
+                quality=settings.POST_IMAGE_QUALITY[format_])
+            path = default_storage.save(path, ContentFile(content.getvalue()))
+            variants.append([format_, width, path])
+    return variants
+
+
+def make(post_id, name):
+    """Строит варианты картинки name и записывает их посту.
+
+    У одинаковых картинок один файл, поэтому готовые варианты другого
+    поста с тем же файлом берутся как есть.
+    """
+    # картинку могли заменить, пока варианты строились
+    Post.objects.filter(id=post_id, image=name).update(
+        image_variants=images.shared_variants(name)
+        or json.dumps(build(name)))
+
+
+def generate(post_id, name):
+    """make для процесса пула."""
+    try:
+        make(post_id, name)
+    finally:
+        connections.close_all()
+
+
+def parse(value):
+    """Список [формат, ширина, файл] из Post.image_variants.
+
+    Поле могли заполнить вручную или импортом, поэтому испорченное
+    значение даёт пустой список, а не ошибку страницы.
+    """
+    try:
+        variants = json.loads(value or '[]')
+    except ValueError:
+        return []
+    if not isinstance(variants, list):
+        return []
+    for variant in variants:
+        if not (isinstance(variant, list) and len(variant) == 3
+                and variant[0] in CONTENT_TYPES
+                and isinstance(variant[1], int)
+                and isinstance(variant[2], str)):
+            return []
+    return variants
+
+
+def paths(value):
+    return [path for _, _, path in parse(value)]
+
+
+def sources(post):
+    """Варианты поста по форматам в порядке POST_IMAGE_FORMATS.
+
+    Для каждого формата — MIME, srcset и src: самый широкий вариант,
+    не превышающий кадр миниатюры, для браузеров без srcset. Пустой
+    список — показывать миниатюру sorl.
+    """
+    frame_width = geometry()[0]
+    by_format = {}
+    for format_, width, path in parse(post.image_variants):
+        by_format.setdefault(format_, []).append(
+            (width, default_storage.url(path)))
+    return [
+        {
+            'type': CONTENT_TYPES[format_],
+            'srcset': ', '.join(f'{url} {width}w' for width, url in urls),
+            'src': ([url for width, url in urls if width <= frame_width]
+                    or [urls[0][1]])[-1],
+        }
+        for format_, urls in by_format.items()
+    ]
@@ -1,53 +1,152 @@
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.replicas import pin_to_primary, read_from_replica
+from core.sqlite import atomic_with_retry
+
+from posts import archive, feed_cache, group_stats, search, write_behind
+from posts.conditional import (conditional, group_parts, index_parts,
+                               post_parts, profile_parts)
 from posts.forms import CommentForm, PostForm
-from posts.models import Follow, Group, Post, User
-from yatube.settings import POST_PER_PAGE
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import CursorPaginator
+from yatube.settings import COMMENTS_PER_PAGE, POST_PER_PAGE
+
+SORT_LABELS = (
+    ('trending', 'Популярные'),
+    ('posts', 'Больше постов'),
+    ('recent', 'Недавно активные'),
+    ('title', 'По названию'),
+)
+
+
+def page_objects(request, post, ordering=('-pub_date', '-id')):
+    # ?cursor= включает keyset-пагинацию без COUNT(*) и OFFSET
+    if 'cursor' in request.GET:
+        return CursorPaginator(post, POST_PER_PAGE, ordering).get_page(
+            request.GET['cursor'])
+    return Paginator(post, POST_PER_PAGE).get_page(request.GET.get('page'))
 
 
-def page_objects(request, post):
-    return Paginator(post, POST_PER_PAGE).get_page(request.GET.get('page'))
+def comment_page(request, post_id):
+    # keyset по (created, id): цена страницы не зависит от числа
+    # комментариев, авторы приходят тем же запросом через JOIN
+    return CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        COMMENTS_PER_PAGE, ordering=('-created', '-id'),
+    ).get_page(request.GET.get('cursor'))
 
 
+@read_from_replica
+@conditional(index_parts)
 def index(request):
     return render(request, 'posts/index.html', {
-        'page_obj': page_objects(request, Post.objects.all()),
+        'page_obj': page_objects(request, Post.objects.with_related()),
+        **feed_cache.context(feed_cache.INDEX_FEED),
     })
 
 
+@read_from_replica
+def group_list(request):
+    sort = request.GET.get('sort')
+    if sort not in group_stats.SORTS:
+        sort = group_stats.DEFAULT_SORT
+    return render(request, 'posts/groups.html', {
+        'sort': sort,
+        'sorts': SORT_LABELS,
+        'page_obj': Paginator(
+            group_stats.with_stats(Group.objects.all()).order_by(
+                *group_stats.SORTS[sort]),
+            POST_PER_PAGE,
+        ).get_page(request.GET.get('page')),
+    })
+
+
+@read_from_replica
+@conditional(group_parts)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': page_objects(request, group.posts.all())
+        'page_obj': page_objects(request, group.posts.with_related())
     })
 
 
+@read_from_replica
+@conditional(profile_parts)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
     return render(request, 'posts/profile.html', {
         'author': author,
-        'page_obj': page_objects(request, author.posts.all()),
+        'page_obj': page_objects(request, author.posts.with_related()),
         'following': (
             request.user.is_authenticated
             and request.user.username != username
-            and author.following.filter(
+            and (author.following.filter(
                 author=author,
-                user=request.user).exists())
+                user=request.user).exists()
+                or write_behind.pending_follow(request.user.id, author.id)))
+    })
+
+
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.user != author:
+        return redirect('posts:profile', username)
+    response = StreamingHttpResponse(
+        archive.lines(author), content_type='application/x-ndjson')
+    response['Content-Disposition'] = (
+        f'attachment; filename="{author.username}-posts.ndjson"')
+    return response
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    return render(request, 'posts/search.html', {
+        'query': query,
+        # ключ курсора не знает ранга релевантности, поэтому у поиска
+        # всегда номера страниц
+        'page_obj': Paginator(
+            search.search(Post.objects.with_related(), query), POST_PER_PAGE
+        ).get_page(request.GET.get('page')),
     })
 
 
+@read_from_replica
+@conditional(post_parts)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.with_related().select_related(
+            'author__counters', 'counters'),
+        id=post_id)
     return render(request, 'posts/post_detail.html', {
         'post': post,
+        'comments': comment_page(request, post.id),
+        'pending_comments': (
+            [] if 'cursor' in request.GET
+            else write_behind.pending_comments(post.id, request.user)),
         'form': CommentForm(),
     })
 
 
+@read_from_replica
+@conditional(post_parts)
+def post_comments(request, post_id):
+    # следующая порция комментариев для кнопки «Показать ещё»
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    return render(request, 'posts/includes/comments.html', {
+        'post': post,
+        'comments': comment_page(request, post.id),
+    })
+
+
 @login_required
+@pin_to_primary
+@atomic_with_retry
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None,)
     if not form.is_valid():
@@ -59,6 +158,8 @@ def post_create(request):
 
 
 @login_required
+@pin_to_primary
+@atomic_with_retry
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if request.user != post.author:
@@ -72,10 +173,15 @@ def post_edit(request, post_id):
 
 
 @login_required
+@pin_to_primary
+@atomic_with_retry
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    if form.is_valid() and write_behind.enabled():
+        write_behind.add_comment(
+            post.id, request.user.id, form.cleaned_data['text'])
+    elif form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
@@ -84,25 +190,45 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user).select_related('author', 'group')
+    page_obj = page_objects(
+        request,
+        request.user.feed_items.select_related('post__author', 'post__group'),
+        ordering=('-pub_date', '-post_id'))
+    page_obj.object_list = [item.post for item in page_obj.object_list]
     return render(request, 'posts/follow.html', {
-        'page_obj': page_objects(request, posts),
+        'page_obj': page_obj,
+        **feed_cache.context(
+            feed_cache.FOLLOW_FEED,
+            feed_cache.user_follow_feed(request.user.id)),
     })
 
 
 @login_required
+@pin_to_primary
+@atomic_with_retry
 def profile_follow(request, username):
-    if username != request.user.username:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=get_object_or_404(User, username=username))
+    if username == request.user.username:
+        return redirect('posts:profile', username)
+    author = get_object_or_404(User, username=username)
+    if write_behind.enabled():
+        write_behind.add_follow(request.user.id, author.id)
+    else:
+        Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username)
 
 
 @login_required
+@pin_to_primary
+@atomic_with_retry
 def profile_unfollow(request, username):
+    if write_behind.enabled():
+        # подписка могла ещё не дойти из журнала до базы
+        author = get_object_or_404(User, username=username)
+        write_behind.cancel_follow(request.user.id, author.id)
+        Follow.objects.filter(user=request.user, author=author).delete()
+        return redirect('posts:profile', username)
     get_object_or_404(
         Follow, user=request.user, author__username=username).delete()
     return redirect('posts:profile', username)
@@ -0,0 +1,250 @@
+"""Отложенная запись комментариев и подписок.
+
+При WRITE_BEHIND представления не пишут комментарии и подписки в
+базу, а дописывают их в локальный журнал — отдельный файл SQLite с
+synchronous=FULL, поэтому принятая запись переживает падение процесса.
+Фоновый поток раз в WRITE_BEHIND_INTERVAL секунд переносит журнал
+в базу пачками bulk_create по WRITE_BEHIND_BATCH записей в одной
+транзакции и сам обновляет счётчики, ленты и поколения кэша, которые
+для одиночных записей обновляют сигналы. Пока запись в журнале,
+её автор видит свой комментарий и подписку из журнала.
+
+Пачка удаляется из журнала после фиксации транзакции базы; если
+процесс упадёт между этими шагами, пачка будет записана повторно.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, DateTimeField, Max, Value, When
+from django.utils import timezone
+
+from core.sqlite import retry_on_lock
+from posts import counters, feed_cache, feeds
+from posts.bulk import batches
+from posts.models import Comment, Follow, Post, User
+
+logger = logging.getLogger(__name__)
+
+COMMENT = 'comment'
+FOLLOW = 'follow'
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS pending ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, '
+    'user_id INTEGER NOT NULL, target_id INTEGER NOT NULL, '
+    "text TEXT NOT NULL DEFAULT '', created TEXT NOT NULL)",
+    'CREATE INDEX IF NOT EXISTS pending_user_idx '
+    'ON pending (user_id, kind, target_id)',
+)
+
+_local = threading.local()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enabled():
+    return settings.WRITE_BEHIND
+
+
+def journal():
+    """Соединение потока с файлом журнала."""
+    path = settings.WRITE_BEHIND_PATH
+    db = getattr(_local, 'db', None)
+    if db is None or _local.path != path:
+        db = sqlite3.connect(path, isolation_level=None, timeout=5)
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = FULL')
+        for statement in SCHEMA:
+            db.execute(statement)
+        _local.db, _local.path = db, path
+    return db
+
+
+def _append(kind, user_id, target_id, text=''):
+    journal().execute(
+        'INSERT INTO pending (kind, user_id, target_id, text, created) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (kind, user_id, target_id, text, timezone.now().isoformat()))
+    start_worker()
+
+
+def add_comment(post_id, author_id, text):
+    _append(COMMENT, author_id, post_id, text)
+
+
+def add_follow(user_id, author_id):
+    _append(FOLLOW, user_id, author_id)
+
+
+def cancel_follow(user_id, author_id):
+    """Убирает из журнала ещё не записанную подписку."""
+    if not enabled():
+        return 0
+    return journal().execute(
+        'DELETE FROM pending WHERE user_id = ? AND kind = ? '
+        'AND target_id = ?', (user_id, FOLLOW, author_id)).rowcount
+
+
+def pending_comments(post_id, user):
+    """Комментарии пользователя к посту, ещё не дошедшие до базы."""
+    if not enabled() or not user.is_authenticated:
+        return []
+    return [
+        Comment(
+            post_id=post_id, author=user, text=text,
+            created=datetime.fromisoformat(created))
+        for text, created in journal().execute(
+            'SELECT text, created FROM pending WHERE user_id = ? '
+            'AND kind = ? AND target_id = ? ORDER BY id DESC',
+            (user.id, COMMENT, post_id))
+    ]
+
+
+def pending_follow(user_id, author_id):
+    if not enabled():
+        return False
+    return journal().execute(
+        'SELECT 1 FROM pending WHERE user_id = ? AND kind = ? '
+        'AND target_id = ?', (user_id, FOLLOW, author_id)
+    ).fetchone() is not None
+
+
+def version(user_id):
+    """Номер последней записи пользователя в журнале для ETag."""
+    if not enabled():
+        return 0
+    return journal().execute(
+        'SELECT coalesce(max(id), 0) FROM pending WHERE user_id = ?',
+        (user_id,)).fetchone()[0]
+
+
+def _existing(model, ids):
+    return set(model.objects.filter(id__in=ids).values_list('id', flat=True))
+
+
+def _insert_comments(comments):
+    """bulk_create комментариев с датами записи в журнал.
+
+    auto_now_add перезаписывает created при вставке, а отключать его
+    из фонового потока нельзя: поле общее для всего процесса. Поэтому
+    даты ставятся следующим UPDATE. Вставка идёт в транзакции _write,
+    и SQLite выдаёт новым строкам id по возрастанию в порядке списка.
+    """
+    if not comments:
+        return
+    dates = [comment.created for comment in comments]
+    last_id = Comment.objects.aggregate(last=Max('id'))['last'] or 0
+    Comment.objects.bulk_create(comments)
+    inserted = Comment.objects.filter(id__gt=last_id)
+    ids = inserted.order_by('id').values_list('id', flat=True)
+    # по 200 веток CASE: SQL-параметров не больше лимита SQLite
+    for batch in batches(zip(ids, dates), 200):
+        inserted.filter(id__in=[comment_id for comment_id, _ in batch]).update(
+            created=Case(
+                *(When(id=comment_id, then=Value(created))
+                  for comment_id, created in batch),
+                output_field=DateTimeField()))
+
+
+@transaction.atomic
+def _write(rows):
+    comments = [row for row in rows if row[0] == COMMENT]
+    follows = {(row[1], row[2]) for row in rows if row[0] == FOLLOW}
+    # автор, пост или пользователь могли быть удалены, пока запись ждала
+    users = _existing(User, {row[1] for row in rows} | {
+        author_id for _, author_id in follows})
+    posts = _existing(Post, {row[2] for row in comments})
+    # дата комментария — время записи в журнал, а не время сброса
+    comments = [
+        Comment(
+            post_id=post_id, author_id=author_id, text=text,
+            created=datetime.fromisoformat(created))
+        for _, author_id, post_id, text, created in comments
+        if author_id in users and post_id in posts
+    ]
+    follows = {
+        (user_id, author_id) for user_id, author_id in follows
+        if user_id in users and author_id in users and user_id != author_id
+    }
+    if follows:
+        follows -= set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in follows},
+            author_id__in={author_id for _, author_id in follows},
+        ).values_list('user_id', 'author_id'))
+    _insert_comments(comments)
+    Follow.objects.bulk_create(
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in follows)
+    # bulk_create не отправляет сигналы: производные данные обновляем
+    # сами, одним UPDATE на пользователя и пост
+    user_deltas = defaultdict(Counter)
+    post_deltas = Counter()
+    for comment in comments:
+        user_deltas[comment.author_id]['comments'] += 1
+        post_deltas[comment.post_id] += 1
+    for user_id, author_id in follows:
+        user_deltas[user_id]['follows'] += 1
+        user_deltas[author_id]['followers'] += 1
+        feeds.backfill(user_id, author_id)
+    for user_id, deltas in user_deltas.items():
+        counters.change_user(user_id, **deltas)
+    for post_id, delta in post_deltas.items():
+        counters.change_post(post_id, comments=delta)
+    feed_cache.bump(
+        *([feed_cache.COMMENTS] if post_deltas else []),
+        *(feed_cache.post_page(post_id) for post_id in post_deltas),
+        *(feed_cache.user_follow_feed(user_id) for user_id, _ in follows))
+    return len(comments) + len(follows)
+
+
+def flush(limit=None):
+    """Переносит в базу одну пачку журнала; возвращает её размер.
+
+    Пачка удерживает блокировку записи журнала до своего удаления,
+    поэтому параллельные сбросы не запишут её дважды.
+    """
+    db = journal()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        rows = db.execute(
+            'SELECT id, kind, user_id, target_id, text, created '
+            'FROM pending '
+            'ORDER BY id LIMIT ?',
+            (limit or settings.WRITE_BEHIND_BATCH,)).fetchall()
+        if rows:
+            retry_on_lock(lambda: _write([row[1:] for row in rows]))
+            db.execute('DELETE FROM pending WHERE id <= ?', (rows[-1][0],))
+        db.execute('COMMIT')
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    return len(rows)
+
+
+def _run():
+    while True:
+        time.sleep(settings.WRITE_BEHIND_INTERVAL)
+        try:
+            while flush():
+                pass
+        except Exception:
+            logger.exception('Не удалось сбросить журнал отложенной записи')
+        finally:
+            connections.close_all()
+
+
+def start_worker():
+    """Запускает фоновый сброс журнала, если он включён и ещё не идёт."""
+    global _worker
+    if not settings.WRITE_BEHIND_INTERVAL:
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_run, name='write-behind', daemon=True)
+            _worker.start()
@@ -1,4 +1,7 @@
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
+from django.template import loader
+
+from core import tasks
 
 from posts.models import User
 
@@ -7,3 +10,20 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Письмо сброса пароля уходит через очередь, а не в запросе."""
+
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        subject = ''.join(loader.render_to_string(
+            subject_template_name, context).splitlines())
+        html_message = None
+        if html_email_template_name is not None:
+            html_message = loader.render_to_string(
+                html_email_template_name, context)
+        tasks.send_mail(
+            subject, loader.render_to_string(email_template_name, context),
+            from_email, [to_email], html_message=html_message)
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,7 +58,8 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        #  Шаблонизатор Django с замером времени рендеринга для метрик
+        'BACKEND': 'core.metrics.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],  # Искать шаблоны на уровне проекта
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,13 +76,54 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+#  ASGI: uvicorn yatube.asgi:application; число потоков, в которых
+#  идут представления, ORM и шаблоны
+ASGI_THREADS = 16
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        #  Постоянные соединения: PRAGMA и кэш страниц SQLite переживают
+        #  запрос, а не создаются заново
+        'CONN_MAX_AGE': 60,
     }
 }
+#  Реплики только для чтения через запятую, например
+#  YATUBE_DB_REPLICAS=replica1.sqlite3,replica2.sqlite3
+DATABASE_REPLICAS = []
+#  Файлы реплик: в них пишет sync_replicas
+DATABASE_REPLICA_PATHS = {}
+for number, name in enumerate(filter(
+        None, os.getenv('YATUBE_DB_REPLICAS', '').split(','))):
+    alias = f'replica_{number}'
+    DATABASE_REPLICAS.append(alias)
+    DATABASE_REPLICA_PATHS[alias] = os.path.join(BASE_DIR, name)
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        #  только чтение: ненайденный файл реплики даёт ошибку, а не
+        #  создаётся пустым
+        'NAME': f'file:{DATABASE_REPLICA_PATHS[alias]}?mode=ro',
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+#  PRAGMA для каждого нового соединения SQLite, см. core/sqlite.py
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    #  отрицательное значение — размер в КиБ
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+#  Сколько раз повторять транзакцию, упёршуюся в блокировку SQLite
+SQLITE_LOCK_RETRIES = 5
+#  Сколько секунд после записи клиент читает только с основной базы
+REPLICA_PIN_SECONDS = 10
+#  Через сколько секунд снова пробовать недоступную реплику
+REPLICA_RETRY_SECONDS = 30
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -104,7 +147,8 @@ AUTH_PASSWORD_VALIDATORS = [
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        #  LocMemCache со счётчиками попаданий для метрик
+        'BACKEND': 'core.metrics.InstrumentedLocMemCache',
     }
 }
 
@@ -120,9 +164,24 @@ USE_L10N = True
 
 USE_TZ = True
 
+#  Доля запросов с подробными метриками SQL, шаблонов и кэша
+METRICS_SAMPLE_RATE = 0.05
+
 #  Константы мои
 POST_PER_PAGE = 10
 MAX_LENGHT_STR = 15
+#  Размер пачки при заполнении лент подписок
+FEED_BATCH_SIZE = 1000
+#  Время жизни фрагментов лент в кэше, сек.
+FEED_CACHE_TIMEOUT = 60 * 60 * 3
+#  Сколько постов читать из базы за раз при выгрузке архива
+EXPORT_CHUNK_SIZE = 500
+#  Число постов в RSS и Atom лентах
+SYNDICATION_ITEMS = 20
+#  Число комментариев, загружаемых на странице поста за раз
+COMMENTS_PER_PAGE = 20
+#  Сколько постов JSON API отдаёт одним пакетным запросом
+API_BATCH_SIZE = 100
 
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
@@ -131,3 +190,39 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_POST_PATH = 'posts/'
+
+#  Миниатюра картинки поста в лентах и на странице поста
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+#  Загрузка картинок: предельный размер файла, МБ, а после обработки
+#  в пуле — наибольшая сторона, пикс., и качество перекодирования
+POST_IMAGE_MAX_UPLOAD_MB = 20
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_UPLOAD_QUALITY = 85
+#  Ширины и форматы адаптивных вариантов картинки поста для srcset;
+#  форматы, которых не умеет установленный Pillow, пропускаются
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+POST_IMAGE_QUALITY = {'avif': 60, 'webp': 75, 'jpeg': 80}
+#  Атрибут sizes: какую ширину картинка занимает на экране
+POST_IMAGE_SIZES = '(max-width: 992px) 100vw, 960px'
+#  Число процессов обработки картинок; 0 — обрабатывать в запросе
+IMAGE_WORKERS = os.cpu_count()
+
+#  Отложенная запись комментариев и подписок через локальный журнал;
+#  включается переменной окружения YATUBE_WRITE_BEHIND=1
+WRITE_BEHIND = os.getenv('YATUBE_WRITE_BEHIND') == '1'
+WRITE_BEHIND_PATH = os.path.join(BASE_DIR, 'write_behind.sqlite3')
+#  Записей журнала в одной транзакции сброса
+WRITE_BEHIND_BATCH = 500
+#  Пауза фонового сброса журнала, сек.; None — только командой
+WRITE_BEHIND_INTERVAL = 1
+
+#  Фоновые задачи core/tasks.py: число попыток, первая пауза перед
+#  повтором (сек., дальше вдвое больше) и аренда задачи обработчиком
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 30
+TASK_LEASE_SECONDS = 300
+TASK_BATCH_SIZE = 100
+#  Пауза фонового потока задач, сек.; None — только командой run_tasks
+TASK_WORKER_INTERVAL = 1
@@ -0,0 +1,11 @@
+"""Настройки для тестов: manage.py test и pytest (см. pytest.ini).
+
+Фоновые процессы и потоки не видят тестовую базу и её транзакции,
+поэтому картинки обрабатываются в запросе, а журнал отложенной записи
+и очередь задач разбираются только явным вызовом из теста.
+"""
+from yatube.settings import *  # noqa: F401,F403
+
+IMAGE_WORKERS = 0
+WRITE_BEHIND_INTERVAL = None
+TASK_WORKER_INTERVAL = None